@@ -0,0 +1,24 @@
+"""add_assignment_layout_template
+
+Revision ID: 2c9a6e4f8b13
+Revises: 8d1f5c0e7a42
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c9a6e4f8b13'
+down_revision = '8d1f5c0e7a42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('assignments', sa.Column('layout_template', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('assignments', 'layout_template')
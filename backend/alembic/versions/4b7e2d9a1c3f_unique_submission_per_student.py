@@ -0,0 +1,44 @@
+"""unique_submission_per_student
+
+Revision ID: 4b7e2d9a1c3f
+Revises: cf63f973b9ad
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b7e2d9a1c3f'
+down_revision = 'cf63f973b9ad'
+branch_labels = None
+depends_on = None
+
+
+# Submissions that lost a double-submit race: a newer row for the same student/assignment
+DUPLICATE_SUBMISSIONS = """
+    SELECT s.id FROM submissions s
+    JOIN submissions o
+      ON o.assignment_id = s.assignment_id
+     AND o.student_id = s.student_id
+     AND o.id < s.id
+"""
+
+
+def upgrade() -> None:
+    # Keep the earliest submission per (assignment, student) so the constraint can be created
+    op.execute(f"DELETE FROM answers WHERE submission_id IN ({DUPLICATE_SUBMISSIONS})")
+    op.execute(f"DELETE FROM submissions WHERE id IN ({DUPLICATE_SUBMISSIONS})")
+
+    op.add_column('submissions', sa.Column('idempotency_key', sa.String(), nullable=True))
+    op.create_unique_constraint(
+        'uq_submissions_assignment_student',
+        'submissions',
+        ['assignment_id', 'student_id']
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_submissions_assignment_student', 'submissions', type_='unique')
+    op.drop_column('submissions', 'idempotency_key')
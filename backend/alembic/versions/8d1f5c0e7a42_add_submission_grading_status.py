@@ -0,0 +1,31 @@
+"""add_submission_grading_status
+
+Revision ID: 8d1f5c0e7a42
+Revises: 4b7e2d9a1c3f
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d1f5c0e7a42'
+down_revision = '4b7e2d9a1c3f'
+branch_labels = None
+depends_on = None
+
+submission_status = sa.Enum('PENDING', 'GRADED', 'FAILED', name='submissionstatus')
+
+
+def upgrade() -> None:
+    # Existing submissions were graded inline, so they start out as GRADED
+    submission_status.create(op.get_bind(), checkfirst=True)
+    op.add_column('submissions', sa.Column('status', submission_status, server_default='GRADED', nullable=False))
+    op.add_column('submissions', sa.Column('pending_answers', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('submissions', 'pending_answers')
+    op.drop_column('submissions', 'status')
+    submission_status.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,28 @@
+"""add_upload_job_progress
+
+Revision ID: a4f7c1d9e2b6
+Revises: 6e3b8f2d5a90
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4f7c1d9e2b6'
+down_revision = '6e3b8f2d5a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('upload_jobs', sa.Column('stage', sa.String(), server_default='received', nullable=False))
+    op.add_column('upload_jobs', sa.Column('progress', sa.JSON(), nullable=True))
+    op.add_column('upload_jobs', sa.Column('extracted_answers', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('upload_jobs', 'extracted_answers')
+    op.drop_column('upload_jobs', 'progress')
+    op.drop_column('upload_jobs', 'stage')
@@ -0,0 +1,30 @@
+"""add_submission_grading_claim
+
+Revision ID: b8e2d4f6a1c7
+Revises: a4f7c1d9e2b6
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e2d4f6a1c7'
+down_revision = 'a4f7c1d9e2b6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        # ADD VALUE cannot run inside a transaction block
+        with op.get_context().autocommit_block():
+            op.execute("ALTER TYPE submissionstatus ADD VALUE IF NOT EXISTS 'GRADING'")
+    op.add_column('submissions', sa.Column('locked_until', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    # Postgres cannot drop an enum value; claimed submissions go back to the queue
+    op.execute("UPDATE submissions SET status = 'PENDING' WHERE status = 'GRADING'")
+    op.drop_column('submissions', 'locked_until')
@@ -0,0 +1,30 @@
+"""clear_stored_feedback_errors
+
+Revision ID: d3a9c5e1f7b2
+Revises: b8e2d4f6a1c7
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3a9c5e1f7b2'
+down_revision = 'b8e2d4f6a1c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The feedback endpoint used to save Ollama error messages as feedback;
+    # clear them so they are generated again
+    op.execute(
+        "UPDATE answers SET ai_feedback = NULL WHERE "
+        "ai_feedback LIKE 'Error: Ollama %' OR "
+        "ai_feedback LIKE 'Error: Could not connect to Ollama%' OR "
+        "ai_feedback LIKE 'Error generating feedback:%'"
+    )
+
+
+def downgrade() -> None:
+    pass
@@ -6,6 +6,67 @@ class Settings(BaseSettings):
     JWT_SECRET: str
     JWT_ALGORITHM: str = "HS256"
     CORS_ORIGINS: List[str] = ["http://localhost:5173", "http://localhost:3000"]
+
+    # Async grading queue (submissions sent with "Prefer: respond-async")
+    GRADING_WORKERS: int = 2  # Grading processes; 0 grades in a thread instead
+    GRADING_QUEUE_SIZE: int = 1000  # Queued submissions before new ones get 503
+    GRADING_LEASE_SECONDS: int = 300  # A claimed submission held longer than this is assumed abandoned
+
+    # Uploads
+    MAX_UPLOAD_BYTES: int = 50 * 1024 * 1024  # Larger request bodies are rejected with 413
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024  # Uploads are streamed to disk in chunks this size
+    UPLOAD_DIR: str = "uploads"  # Files of queued uploads ("Prefer: respond-async")
+    UPLOAD_WORKERS: int = 2  # Background upload jobs processed concurrently per API process
+    UPLOAD_JOB_MAX_ATTEMPTS: int = 3  # Then the job is dead-lettered
+    UPLOAD_JOB_RETRY_SECONDS: int = 30  # First retry delay, doubled on every further attempt
+    UPLOAD_JOB_LEASE_SECONDS: int = 600  # A job held longer than this is assumed abandoned
+    UPLOAD_JOB_POLL_SECONDS: float = 2.0
+
+    # Server-sent progress events
+    EVENTS_POLL_SECONDS: float = 0.5  # How often a stream re-reads job state
+    EVENTS_KEEPALIVE_SECONDS: int = 15
+    EVENTS_MAX_SECONDS: int = 600  # Streams end with a "timeout" event; clients reconnect
+
+    # OCR
+    OCR_LANGUAGES: List[str] = ["en"]
+    OCR_READER_POOL_SIZE: int = 1  # Preloaded EasyOCR readers per process
+    OCR_WARMUP: bool = True  # Run a dummy image through each reader at startup
+    OCR_TORCH_THREADS: int = 0  # torch threads per OCR process; 0 = torch default (all cores)
+    OCR_WORKERS: int = 2  # OCR processes; 0 runs OCR in a thread of the API process
+    OCR_MAX_QUEUE: int = 16  # In-flight OCR tasks before uploads get 503
+    OCR_RETRY_AFTER_SECONDS: int = 10
+    OCR_START_METHOD: str = "spawn"  # multiprocessing start method for OCR workers
+    OCR_TESSERACT_LANGUAGES: str = "eng"  # Tesseract language codes, joined with "+"
+    OCR_TESSERACT_FIRST_PASS: bool = False  # Try tesserocr before EasyOCR; needs tesserocr installed
+    OCR_TESSERACT_MIN_CONFIDENCE: float = 80.0  # Mean word confidence (0-100) to accept the first pass
+    OCR_PDF_DPI: int = 200  # Resolution used to rasterize scanned PDF pages
+    OCR_PAGE_WINDOW: int = 0  # Pages of one PDF rendered/OCR'd at once; 0 = one per OCR worker
+    OCR_MIN_PAGE_TEXT_CHARS: int = 20  # Below this a PDF page's text layer is ignored
+    OCR_MAX_PAGE_IMAGE_COVERAGE: float = 0.5  # Above this a PDF page is OCR'd as a scan
+    # Image preprocessing before OCR; each step can be switched on or off on its own.
+    # Binarize, deskew and crop stay off until benchmarks/ocr_benchmark.py shows no accuracy loss
+    OCR_PREPROCESS_DOWNSCALE: bool = True
+    OCR_PREPROCESS_TARGET_DPI: int = 200  # Larger images are downscaled to this resolution
+    OCR_PREPROCESS_GRAYSCALE: bool = True
+    OCR_PREPROCESS_BINARIZE: bool = False
+    OCR_BINARIZE_BLOCK_SIZE: int = 31  # Neighbourhood (px) for the adaptive threshold
+    OCR_BINARIZE_OFFSET: int = 10  # How much darker than its neighbourhood ink must be
+    OCR_PREPROCESS_DESKEW: bool = False
+    OCR_DESKEW_MAX_ANGLE: float = 10.0  # Degrees searched either way
+    OCR_PREPROCESS_CROP: bool = False
+    OCR_CROP_MARGIN: int = 16  # Pixels kept around the written area
+    OCR_CACHE_ENABLED: bool = True
+    OCR_CACHE_DIR: str = ".ocr_cache"  # Results keyed by file SHA-256 + OCR settings
+    OCR_CACHE_MAX_BYTES: int = 256 * 1024 * 1024  # LRU eviction above this size
+
+    # LLM feedback (Ollama)
+    OLLAMA_BASE_URL: str = "http://localhost:11434"
+    OLLAMA_MODEL: str = "mistral"
+    OLLAMA_TIMEOUT_SECONDS: float = 30.0  # Waiting for a generation to finish
+    OLLAMA_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    OLLAMA_MAX_CONNECTIONS: int = 8  # Pooled connections shared by all requests of a process
+    OLLAMA_KEEPALIVE_SECONDS: float = 60.0  # Idle pooled connections are closed after this
+    OLLAMA_MAX_PARALLEL: int = 4  # Generations in flight per process; match OLLAMA_NUM_PARALLEL on the server
     
     class Config:
         env_file = ".env"
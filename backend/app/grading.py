@@ -1,5 +1,5 @@
 import re
-from typing import Tuple
+from typing import Dict, List, Tuple
 from sympy import sympify, simplify, Symbol, Eq, solve
 from app.models import QuestionType
 
@@ -23,6 +23,19 @@ def grade_answer(question_type: QuestionType, correct_answer: str, student_answe
         return False, 0.0
 
 
+def grade_answers(items: List[Tuple[QuestionType, str, str]]) -> List[Tuple[bool, float]]:
+    """
+    Grade a batch of (question_type, correct_answer, student_answer) items.
+    Identical items are graded once, so common answers across a class only hit SymPy once.
+    Module-level so it can run in a worker process.
+    """
+    results: Dict[Tuple[QuestionType, str, str], Tuple[bool, float]] = {}
+    for item in items:
+        if item not in results:
+            results[item] = grade_answer(*item)
+    return [results[item] for item in items]
+
+
 def grade_numeric(correct_answer: str, student_answer: str) -> Tuple[bool, float]:
     """Grade numeric answers with tolerance."""
     try:
@@ -1,13 +1,44 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.database import engine, Base
-from app.routers import auth, classrooms, assignments, submissions, analytics, students, upload, feedback
+from app.routers import auth, classrooms, assignments, submissions, analytics, students, upload, feedback, metrics
 from app.models import *  # Import all models so they're registered with Base
+from app.services.grading_queue import grading_queue
+from app.services.upload_queue import upload_queue
+from app.core.config import settings
+from app.core.middleware import RequestSizeLimitMiddleware
+from app.services.ocr import init_reader_pool
+from app.services.ocr_pool import ocr_pool
+from app.services import llm_feedback
 
 # Create tables
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="ClassIQ API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load and warm OCR models once instead of on the first upload: in the
+    # OCR worker processes, or in this process when OCR runs in threads
+    if settings.OCR_WORKERS > 0:
+        await ocr_pool.start()
+    else:
+        await asyncio.to_thread(init_reader_pool)
+    # Start background grading workers for accept-then-grade submissions
+    await grading_queue.start()
+    # Start background workers for queued uploads (including ones left by a restart)
+    await upload_queue.start()
+    # One pooled, keep-alive HTTP client for all Ollama calls
+    llm_feedback.open_client()
+    yield
+    await llm_feedback.close_client()
+    await upload_queue.stop()
+    await grading_queue.stop()
+    ocr_pool.stop()
+
+
+app = FastAPI(title="ClassIQ API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -18,15 +49,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Refuse oversized bodies before they are received; the margin covers multipart framing
+app.add_middleware(RequestSizeLimitMiddleware, max_bytes=settings.MAX_UPLOAD_BYTES + 64 * 1024)
+
 # Include routers
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(classrooms.router, prefix="/classrooms", tags=["classrooms"])
 app.include_router(assignments.router, prefix="/assignments", tags=["assignments"])
 app.include_router(submissions.router, prefix="/assignments", tags=["submissions"])
 app.include_router(upload.router, prefix="/assignments", tags=["upload"])
-app.include_router(feedback.router, prefix="/answers", tags=["feedback"])
+app.include_router(feedback.router, prefix="", tags=["feedback"])
 app.include_router(analytics.router, prefix="", tags=["analytics"])
 app.include_router(students.router, prefix="/students", tags=["students"])
+app.include_router(metrics.router, prefix="", tags=["metrics"])
 
 
 @app.get("/")
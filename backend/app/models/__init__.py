@@ -3,8 +3,9 @@ from app.models.classroom import Classroom
 from app.models.student_profile import StudentProfile
 from app.models.assignment import Assignment, AssignmentStatus
 from app.models.question import Question, QuestionType
-from app.models.submission import Submission
+from app.models.submission import Submission, SubmissionStatus
 from app.models.answer import Answer
+from app.models.upload_job import UploadJob, UploadJobStatus
 
 __all__ = [
     "User",
@@ -16,6 +17,9 @@ __all__ = [
     "Question",
     "QuestionType",
     "Submission",
+    "SubmissionStatus",
     "Answer",
+    "UploadJob",
+    "UploadJobStatus",
 ]
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -19,6 +19,8 @@ class Assignment(Base):
     status = Column(Enum(AssignmentStatus), default=AssignmentStatus.DRAFT, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     due_date = Column(DateTime(timezone=True), nullable=True)
+    # Optional answer-box layout, see schemas.LayoutTemplate
+    layout_template = Column(JSON, nullable=True)
 
     # Relationships
     classroom = relationship("Classroom", back_populates="assignments")
@@ -1,18 +1,32 @@
-from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint, Enum, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+import enum
 from app.core.database import Base
 
+class SubmissionStatus(str, enum.Enum):
+    PENDING = "pending"
+    GRADING = "grading"  # Claimed by a grading queue worker
+    GRADED = "graded"
+    FAILED = "failed"
+
 class Submission(Base):
     __tablename__ = "submissions"
+    __table_args__ = (
+        # One submission per student per assignment, enforced by the database
+        UniqueConstraint("assignment_id", "student_id", name="uq_submissions_assignment_student"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     assignment_id = Column(Integer, ForeignKey("assignments.id"), nullable=False)
     student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     submitted_at = Column(DateTime(timezone=True), server_default=func.now())
+    idempotency_key = Column(String, nullable=True)  # Client-supplied Idempotency-Key header
+    status = Column(Enum(SubmissionStatus), default=SubmissionStatus.GRADED, server_default="GRADED", nullable=False)
+    pending_answers = Column(JSON, nullable=True)  # Raw answers waiting in the grading queue
+    locked_until = Column(DateTime(timezone=True), nullable=True)  # Lease of the worker grading it
 
     # Relationships
     assignment = relationship("Assignment", back_populates="submissions")
     student = relationship("User", back_populates="submissions")
     answers = relationship("Answer", back_populates="submission", cascade="all, delete-orphan")
-
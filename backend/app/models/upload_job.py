@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum, JSON
+from sqlalchemy.sql import func
+import enum
+from app.core.database import Base
+
+class UploadJobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    PROCESSING = "processing"
+    DONE = "done"
+    DEAD = "dead"  # Gave up after retries; the file is kept for inspection
+
+class UploadJob(Base):
+    """An uploaded worksheet waiting for (or done with) background OCR and grading."""
+    __tablename__ = "upload_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    assignment_id = Column(Integer, ForeignKey("assignments.id"), nullable=False)
+    student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    file_path = Column(String, nullable=False)  # Under UPLOAD_DIR
+    content_hash = Column(String, nullable=False)  # SHA-256 of the file, for the OCR cache
+    idempotency_key = Column(String, nullable=True)
+    status = Column(Enum(UploadJobStatus), default=UploadJobStatus.QUEUED, server_default="QUEUED", nullable=False, index=True)
+    attempts = Column(Integer, default=0, server_default="0", nullable=False)
+    available_at = Column(DateTime(timezone=True), nullable=False)  # Not claimed before this (retry backoff)
+    locked_until = Column(DateTime(timezone=True), nullable=True)  # Lease of the worker processing it
+    last_error = Column(Text, nullable=True)
+    # Progress for the events stream: received -> ocr -> extracted -> graded
+    stage = Column(String, default="received", server_default="received", nullable=False)
+    progress = Column(JSON, nullable=True)  # {"done": pages OCR'd, "total": pages} during OCR
+    extracted_answers = Column(JSON, nullable=True)  # Available before grading finishes
+    submission_id = Column(Integer, ForeignKey("submissions.id"), nullable=True)
+    ocr_text = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import insert, select, literal
 from sqlalchemy.orm import Session
 from typing import List
 from app.database import get_db
-from app.models import User, Assignment, Question, Classroom, StudentProfile, Submission, Answer
+from app.models import User, Assignment, AssignmentStatus, Question, Classroom, StudentProfile, Submission, Answer
 from app.schemas import (
     AssignmentCreate, AssignmentResponse, QuestionCreate, QuestionResponse,
-    AssignmentWithQuestions, AssignmentStatusUpdate, UserResponse, AnswerResponse
+    AssignmentWithQuestions, AssignmentStatusUpdate, UserResponse, AnswerResponse,
+    AssignmentCloneRequest, LayoutTemplate
 )
 from app.auth import get_current_teacher, get_current_user
 
@@ -102,6 +104,69 @@ def update_assignment_status(
     return AssignmentResponse.model_validate(assignment)
 
 
+@router.put("/{assignment_id}/layout", response_model=AssignmentResponse)
+def set_layout_template(
+    assignment_id: int,
+    template: LayoutTemplate,
+    current_user: User = Depends(get_current_teacher),
+    db: Session = Depends(get_db)
+):
+    """
+    Set the answer-box layout of a fixed-format worksheet.
+    Uploads for this assignment then OCR only these regions and map them
+    straight to questions instead of parsing the whole page.
+    """
+    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+    if not assignment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Assignment not found")
+
+    # Verify assignment belongs to teacher's classroom
+    classroom = db.query(Classroom).filter(
+        Classroom.id == assignment.classroom_id,
+        Classroom.teacher_id == current_user.id
+    ).first()
+    if not classroom:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not your assignment")
+
+    question_ids = {row.id for row in db.query(Question.id).filter(Question.assignment_id == assignment_id)}
+    unknown = {region.question_id for region in template.regions} - question_ids
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Questions not in this assignment: {sorted(unknown)}"
+        )
+
+    assignment.layout_template = template.model_dump()
+    db.commit()
+    db.refresh(assignment)
+    return AssignmentResponse.model_validate(assignment)
+
+
+@router.delete("/{assignment_id}/layout", response_model=AssignmentResponse)
+def clear_layout_template(
+    assignment_id: int,
+    current_user: User = Depends(get_current_teacher),
+    db: Session = Depends(get_db)
+):
+    """Remove the layout; uploads go back to whole-page OCR."""
+    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+    if not assignment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Assignment not found")
+
+    # Verify assignment belongs to teacher's classroom
+    classroom = db.query(Classroom).filter(
+        Classroom.id == assignment.classroom_id,
+        Classroom.teacher_id == current_user.id
+    ).first()
+    if not classroom:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not your assignment")
+
+    assignment.layout_template = None
+    db.commit()
+    db.refresh(assignment)
+    return AssignmentResponse.model_validate(assignment)
+
+
 @router.get("/{assignment_id}/submissions", response_model=List[dict])
 def get_assignment_submissions(
     assignment_id: int,
@@ -237,3 +302,118 @@ def add_question(
     db.refresh(new_question)
     return QuestionResponse.model_validate(new_question)
 
+
+
+@router.post("/{assignment_id}/questions/bulk", response_model=List[QuestionResponse])
+def add_questions_bulk(
+    assignment_id: int,
+    questions_data: List[QuestionCreate],
+    current_user: User = Depends(get_current_teacher),
+    db: Session = Depends(get_db)
+):
+    """Create many questions with one ownership check and one transaction."""
+    # Verify assignment belongs to teacher's classroom
+    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+    if not assignment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Assignment not found")
+
+    classroom = db.query(Classroom).filter(
+        Classroom.id == assignment.classroom_id,
+        Classroom.teacher_id == current_user.id
+    ).first()
+    if not classroom:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not your assignment")
+
+    if not questions_data:
+        return []
+
+    # Rows come back in payload order, so the response lines up with the request
+    new_questions = db.scalars(
+        insert(Question).returning(Question, sort_by_parameter_order=True),
+        [
+            {
+                "assignment_id": assignment_id,
+                "text": q.text,
+                "correct_answer": q.correct_answer,
+                "question_type": q.question_type,
+                "topic_tag": q.topic_tag
+            }
+            for q in questions_data
+        ]
+    ).all()
+    result = [QuestionResponse.model_validate(q) for q in new_questions]
+    db.commit()
+    return result
+
+
+@router.post("/{assignment_id}/clone", response_model=List[AssignmentResponse])
+def clone_assignment(
+    assignment_id: int,
+    clone_data: AssignmentCloneRequest,
+    current_user: User = Depends(get_current_teacher),
+    db: Session = Depends(get_db)
+):
+    """
+    Copy an assignment and its questions into other classrooms of the same teacher.
+    Rows are copied server-side with INSERT ... SELECT; clones start as drafts.
+    The layout template is not copied since it refers to the source's question ids.
+    """
+    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+    if not assignment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Assignment not found")
+
+    classroom = db.query(Classroom).filter(
+        Classroom.id == assignment.classroom_id,
+        Classroom.teacher_id == current_user.id
+    ).first()
+    if not classroom:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not your assignment")
+
+    # Verify every target classroom belongs to teacher in one query
+    target_ids = list(dict.fromkeys(clone_data.classroom_ids))
+    owned = {
+        row.id for row in db.query(Classroom.id).filter(
+            Classroom.id.in_(target_ids),
+            Classroom.teacher_id == current_user.id
+        )
+    }
+    if owned != set(target_ids):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Classroom not found")
+
+    # Copy the assignment row once per target classroom
+    new_ids = []
+    for classroom_id in target_ids:
+        new_ids.append(db.execute(
+            insert(Assignment).from_select(
+                ["classroom_id", "title", "description", "due_date", "status"],
+                select(
+                    literal(classroom_id),
+                    Assignment.title,
+                    Assignment.description,
+                    Assignment.due_date,
+                    literal(AssignmentStatus.DRAFT, Assignment.status.type)
+                ).where(Assignment.id == assignment_id)
+            ).returning(Assignment.id)
+        ).scalar_one())
+
+    # Copy all questions into all clones in a single statement
+    if new_ids:
+        source = Question.__table__.alias("source")
+        db.execute(
+            insert(Question).from_select(
+                ["assignment_id", "text", "correct_answer", "question_type", "topic_tag"],
+                select(
+                    Assignment.id,
+                    source.c.text,
+                    source.c.correct_answer,
+                    source.c.question_type,
+                    source.c.topic_tag
+                ).join(source, source.c.assignment_id == assignment_id)
+                .where(Assignment.id.in_(new_ids))
+                .order_by(Assignment.id, source.c.id)
+            )
+        )
+    db.commit()
+
+    clones = db.query(Assignment).filter(Assignment.id.in_(new_ids)).order_by(Assignment.id).all()
+    return [AssignmentResponse.model_validate(a) for a in clones]
@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from typing import List
 from app.database import get_db
 from app.models import User, Classroom, StudentProfile, Assignment, Submission, Answer, Question
 from app.schemas import (
     ClassroomCreate, ClassroomResponse, AddStudentRequest, 
-    StudentProfileResponse, UserResponse, AssignmentResponse
+    StudentProfileResponse, UserResponse, AssignmentResponse,
+    BulkAddStudentsRequest, BulkEnrollmentResult, BulkEnrollmentResponse
 )
 from app.auth import get_current_teacher, get_current_user
 
@@ -89,6 +91,76 @@ def add_student(
     )
 
 
+@router.post("/{classroom_id}/students/bulk", response_model=BulkEnrollmentResponse)
+def add_students_bulk(
+    classroom_id: int,
+    roster: BulkAddStudentsRequest,
+    current_user: User = Depends(get_current_teacher),
+    db: Session = Depends(get_db)
+):
+    """Enroll a whole roster at once and report the outcome for every email."""
+    # Verify classroom belongs to teacher
+    classroom = db.query(Classroom).filter(
+        Classroom.id == classroom_id,
+        Classroom.teacher_id == current_user.id
+    ).first()
+    if not classroom:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Classroom not found")
+
+    emails = list(dict.fromkeys(roster.student_emails))
+
+    # Resolve all student users in one query
+    students = db.query(User.id, User.email).filter(
+        User.email.in_(emails),
+        User.role == "student"
+    ).all()
+    user_ids = {s.email: s.id for s in students}
+
+    # Existing enrollments in one query
+    already_enrolled = {
+        row.user_id for row in db.query(StudentProfile.user_id).filter(
+            StudentProfile.classroom_id == classroom_id,
+            StudentProfile.user_id.in_(user_ids.values())
+        )
+    }
+
+    # Insert the remaining enrollments in one statement
+    new_user_ids = [
+        user_ids[email] for email in emails
+        if email in user_ids and user_ids[email] not in already_enrolled
+    ]
+    profile_ids = {}
+    if new_user_ids:
+        inserted = db.execute(
+            insert(StudentProfile)
+            .values([{"user_id": user_id, "classroom_id": classroom_id} for user_id in new_user_ids])
+            .returning(StudentProfile.id, StudentProfile.user_id)
+        )
+        profile_ids = {user_id: profile_id for profile_id, user_id in inserted}
+        db.commit()
+
+    results = []
+    seen = set()
+    for email in roster.student_emails:
+        if email in seen:
+            results.append(BulkEnrollmentResult(student_email=email, status="duplicate"))
+            continue
+        seen.add(email)
+        user_id = user_ids.get(email)
+        if user_id is None:
+            results.append(BulkEnrollmentResult(student_email=email, status="not_found"))
+        elif user_id in already_enrolled:
+            results.append(BulkEnrollmentResult(student_email=email, status="already_enrolled"))
+        else:
+            results.append(BulkEnrollmentResult(
+                student_email=email,
+                status="enrolled",
+                profile_id=profile_ids.get(user_id)
+            ))
+
+    return BulkEnrollmentResponse(enrolled=len(profile_ids), results=results)
+
+
 @router.get("/{classroom_id}/students", response_model=List[StudentProfileResponse])
 def list_students(
     classroom_id: int,
@@ -1,17 +1,22 @@
 """
-Feedback endpoint for generating LLM explanations.
+Feedback endpoints for generating LLM explanations.
 """
+import asyncio
+from typing import AsyncIterator, Dict, List
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import User, Answer, Question
+from app.database import get_db, SessionLocal
+from app.models import User, Answer, Question, Submission
 from app.auth import get_current_user
-from app.services.llm_feedback import generate_feedback_ollama
+from app.services import metrics
+from app.services.events import format_event, sse_response
+from app.services.llm_feedback import request_feedback_ollama, OllamaError
 
 router = APIRouter()
 
 
-@router.post("/{answer_id}/feedback", response_model=dict)
+@router.post("/answers/{answer_id}/feedback", response_model=dict)
 async def generate_feedback(
     answer_id: int,
     current_user: User = Depends(get_current_user),
@@ -28,7 +33,6 @@ async def generate_feedback(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Answer not found")
     
     # Get submission to check student_id
-    from app.models import Submission
     submission = db.query(Submission).filter(Submission.id == answer.submission_id).first()
     if not submission:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Submission not found")
@@ -56,29 +60,147 @@ async def generate_feedback(
             "cached": True
         }
     
-    # Generate new feedback
+    # Generate new feedback; an Ollama failure is reported, not saved as feedback
     try:
-        feedback_text = await generate_feedback_ollama(
+        feedback_text = await request_feedback_ollama(
             question_text=question.text,
             correct_answer=question.correct_answer,
             student_answer=answer.student_answer,
             is_correct=answer.ai_is_correct or False
         )
-        
-        # Save feedback to database
-        answer.ai_feedback = feedback_text
-        db.commit()
-        db.refresh(answer)
-        
-        return {
-            "answer_id": answer_id,
-            "feedback": feedback_text,
-            "cached": False
-        }
+    except OllamaError as e:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(e))
+    
+    # Save feedback to database
+    answer.ai_feedback = feedback_text
+    db.commit()
+    db.refresh(answer)
     
-    except Exception as e:
+    return {
+        "answer_id": answer_id,
+        "feedback": feedback_text,
+        "cached": False
+    }
+
+
+@router.post("/submissions/{submission_id}/feedback", response_model=dict)
+async def generate_submission_feedback(
+    submission_id: int,
+    stream: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Generate LLM feedback for every answer of a submission that lacks it.
+    Generations run concurrently, bounded by OLLAMA_MAX_PARALLEL, and are saved
+    in one commit. Answers that already have feedback are returned as cached.
+
+    With ?stream=true the response is server-sent events: a "feedback" event per
+    answer as it finishes (or "error" if Ollama failed for it), then "done"
+    once the results are saved.
+    """
+    submission = db.query(Submission).filter(Submission.id == submission_id).first()
+    if not submission:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Submission not found")
+    if current_user.role == "student" and submission.student_id != current_user.id:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to generate feedback: {str(e)}"
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Can only request feedback for your own answers"
         )
 
+    rows = db.query(Answer, Question).join(Question, Answer.question_id == Question.id).filter(
+        Answer.submission_id == submission_id
+    ).order_by(Answer.id).all()
+    cached = [
+        {"answer_id": answer.id, "question_id": answer.question_id, "feedback": answer.ai_feedback, "cached": True}
+        for answer, _ in rows if answer.ai_feedback
+    ]
+    # Plain values, so generation does not touch the session
+    pending = [
+        {
+            "answer_id": answer.id,
+            "question_id": answer.question_id,
+            "question_text": question.text,
+            "correct_answer": question.correct_answer,
+            "student_answer": answer.student_answer,
+            "is_correct": answer.ai_is_correct or False,
+        }
+        for answer, question in rows if not answer.ai_feedback
+    ]
+    db.close()  # Don't hold a pooled connection while waiting on Ollama
+
+    if stream:
+        async def events() -> AsyncIterator[str]:
+            for result in cached:
+                yield format_event("feedback", result)
+            failed = 0
+            async for result in _generate_all(pending):
+                failed += "detail" in result
+                yield format_event("error" if "detail" in result else "feedback", result)
+            yield format_event("done", {
+                "submission_id": submission_id,
+                "cached": len(cached),
+                "generated": len(pending) - failed,
+                "failed": failed,
+            })
+
+        return sse_response(events())
+
+    results = [result async for result in _generate_all(pending)]
+    return {
+        "submission_id": submission_id,
+        "feedback": sorted(cached + [r for r in results if "detail" not in r], key=lambda r: r["answer_id"]),
+        "failed": sorted((r for r in results if "detail" in r), key=lambda r: r["answer_id"]),
+    }
+
+
+async def _generate_one(item: dict) -> dict:
+    result = {"answer_id": item["answer_id"], "question_id": item["question_id"]}
+    try:
+        result["feedback"] = await request_feedback_ollama(
+            question_text=item["question_text"],
+            correct_answer=item["correct_answer"],
+            student_answer=item["student_answer"],
+            is_correct=item["is_correct"]
+        )
+        result["cached"] = False
+    except OllamaError as e:
+        result["detail"] = str(e)
+    return result
+
+
+async def _generate_all(pending: List[dict]) -> AsyncIterator[dict]:
+    """
+    Yield results in completion order. Whatever was generated is saved in one
+    commit when the batch ends, or when the client goes away mid-stream (the
+    generations still running are then cancelled).
+    """
+    tasks = [asyncio.create_task(_generate_one(item)) for item in pending]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        results = [task.result() for task in tasks if task.done() and not task.cancelled() and not task.exception()]
+        generated = {r["answer_id"]: r["feedback"] for r in results if "feedback" in r}
+        failed = len(results) - len(generated)
+        if generated:
+            _store_feedback(generated)
+        metrics.increment("feedback_generated", len(generated))
+        metrics.increment("feedback_failed", failed)
+
+
+def _store_feedback(feedback: Dict[int, str]) -> None:
+    db = SessionLocal()
+    try:
+        for answer_id, text in feedback.items():
+            # Keep feedback saved meanwhile by the single-answer endpoint
+            db.query(Answer).filter(
+                Answer.id == answer_id, or_(Answer.ai_feedback.is_(None), Answer.ai_feedback == "")
+            ).update(
+                {Answer.ai_feedback: text}, synchronize_session=False
+            )
+        db.commit()
+    finally:
+        db.close()
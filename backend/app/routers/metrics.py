@@ -0,0 +1,12 @@
+"""
+Operational metrics endpoint (queue depths, cache hit rates, job counters).
+"""
+from fastapi import APIRouter
+from app.services.metrics import snapshot
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_model=dict)
+def get_metrics():
+    return snapshot()
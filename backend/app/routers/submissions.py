@@ -1,21 +1,58 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import csv
+import io
+import json
+from typing import Dict, List, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Request
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter, ValidationError
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from app.database import get_db
-from app.models import User, Assignment, Submission, Answer, Question, StudentProfile
-from app.schemas import SubmissionCreate, SubmissionResponse, AnswerResult
-from app.auth import get_current_student, get_current_user
+from app.database import get_db, SessionLocal
+from app.models import User, Assignment, Submission, SubmissionStatus, Answer, Question, StudentProfile, Classroom
+from app.schemas import (
+    SubmissionCreate, SubmissionResponse, AnswerResult, SubmissionStatusResponse,
+    SubmissionImportRow, SubmissionImportResult, SubmissionImportResponse
+)
+from app.auth import get_current_student, get_current_user, get_current_teacher
 from app.grading import grade_answer
+from app.services.grading_queue import grading_queue, GradingQueueFull
+from app.services.events import event_stream
+from app.services.submissions import (
+    insert_submissions, bulk_grade_and_store, build_submission_response,
+    find_replayable_submission, load_submission_response
+)
 
 router = APIRouter()
 
+_import_rows = TypeAdapter(List[SubmissionImportRow])
+
+
+def _replay_or_reject(
+    assignment_id: int,
+    current_user: User,
+    idempotency_key: Optional[str],
+    db: Session
+) -> Union[SubmissionResponse, JSONResponse]:
+    """
+    The student already has a submission for this assignment. A retry carrying the
+    same Idempotency-Key gets the stored result back, or the 202 status while that
+    submission is still queued; anything else is a duplicate.
+    """
+    existing = find_replayable_submission(db, assignment_id, current_user.id, idempotency_key)
+    if not existing:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Already submitted")
+    if existing.status != SubmissionStatus.GRADED:
+        return _accepted(assignment_id, _submission_status(db, existing))
+    return load_submission_response(db, existing)
+
 
 async def _process_submission(
     assignment_id: int,
     answers_data: list,
     current_user: User,
-    db: Session
-) -> SubmissionResponse:
+    db: Session,
+    idempotency_key: Optional[str] = None
+) -> Union[SubmissionResponse, JSONResponse]:
     """
     Helper function to process submission (shared between typed and OCR submissions).
     """
@@ -32,20 +69,19 @@ async def _process_submission(
             detail="Must answer all questions"
         )
     
-    # Create submission
-    submission = Submission(
-        assignment_id=assignment_id,
-        student_id=current_user.id
-    )
-    db.add(submission)
-    db.commit()
-    db.refresh(submission)
+    # Create submission; the unique constraint rejects duplicates atomically.
+    # The row stays uncommitted while grading, so a concurrent retry waits on it
+    # and then sees the conflict instead of grading a second copy.
+    inserted = insert_submissions(db, assignment_id, [
+        {"student_id": current_user.id, "idempotency_key": idempotency_key}
+    ])
+    if current_user.id not in inserted:
+        db.rollback()
+        return _replay_or_reject(assignment_id, current_user, idempotency_key, db)
+    submission_id = inserted[current_user.id]
     
     # Grade and save answers
-    answer_results = []
-    total_score = 0.0
-    num_questions = len(questions)
-    
+    answers = []
     for answer_data in answers_data:
         # Handle both dict and AnswerSubmission objects
         if isinstance(answer_data, dict):
@@ -62,45 +98,123 @@ async def _process_submission(
             student_answer
         )
         
-        answer = Answer(
-            submission_id=submission.id,
+        answers.append(Answer(
+            submission_id=submission_id,
             question_id=question_id,
             student_answer=student_answer,
             ai_score=score,
             ai_is_correct=is_correct
-        )
-        db.add(answer)
-        total_score += score
-        
-        # Create AnswerResult with answer_id
-        answer_result = AnswerResult(
-            answer_id=answer.id,  # Include answer ID for feedback requests
-            question_id=question_id,
-            student_answer=student_answer,
-            correct_answer=question.correct_answer,
-            ai_is_correct=is_correct,
-            ai_score=score
-        )
-        answer_results.append(answer_result)
+        ))
     
+    db.add_all(answers)
+    db.flush()  # Assign answer IDs for feedback requests
+    result = build_submission_response(submission_id, answers, question_dict)
     db.commit()
     
-    avg_score = total_score / num_questions if num_questions > 0 else 0.0
-    
-    return SubmissionResponse(
+    return result
+
+
+def _submission_status(db: Session, submission: Submission) -> SubmissionStatusResponse:
+    result = None
+    if submission.status == SubmissionStatus.GRADED:
+        result = load_submission_response(db, submission)
+    return SubmissionStatusResponse(
         submission_id=submission.id,
-        total_score=avg_score,
-        answers=answer_results
+        status=submission.status,
+        result=result
+    )
+
+
+def _accepted(assignment_id: int, submission_status: SubmissionStatusResponse) -> JSONResponse:
+    """202 Accepted pointing at the result URL while grading is pending."""
+    status_code = status.HTTP_200_OK
+    if submission_status.status in (SubmissionStatus.PENDING, SubmissionStatus.GRADING):
+        status_code = status.HTTP_202_ACCEPTED
+    return JSONResponse(
+        status_code=status_code,
+        content=submission_status.model_dump(mode="json"),
+        headers={"Location": f"/assignments/{assignment_id}/submissions/{submission_status.submission_id}/result"}
     )
 
 
-@router.post("/{assignment_id}/submissions", response_model=SubmissionResponse)
+async def _queue_submission(
+    assignment_id: int,
+    answers_data: list,
+    current_user: User,
+    db: Session,
+    idempotency_key: Optional[str] = None
+) -> JSONResponse:
+    """
+    Accept-then-grade: store the raw answers as a PENDING submission, hand it to
+    the grading queue and return immediately.
+    """
+    if grading_queue.full():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Grading queue is full, please retry shortly",
+            headers={"Retry-After": "5"}
+        )
+
+    questions = db.query(Question.id).filter(Question.assignment_id == assignment_id).all()
+    submitted_question_ids = {a["question_id"] for a in answers_data}
+    if submitted_question_ids != {q.id for q in questions}:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Must answer all questions"
+        )
+
+    inserted = insert_submissions(db, assignment_id, [{
+        "student_id": current_user.id,
+        "idempotency_key": idempotency_key,
+        "status": SubmissionStatus.PENDING,
+        "pending_answers": answers_data,
+    }])
+    if current_user.id not in inserted:
+        db.rollback()
+        existing = find_replayable_submission(db, assignment_id, current_user.id, idempotency_key)
+        if not existing:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Already submitted")
+        return _accepted(assignment_id, _submission_status(db, existing))
+    db.commit()
+
+    submission_id = inserted[current_user.id]
+    try:
+        grading_queue.enqueue(submission_id)
+    except GradingQueueFull:
+        # Filled up since the check above; drop the submission so the retry is accepted
+        db.query(Submission).filter(
+            Submission.id == submission_id,
+            Submission.status == SubmissionStatus.PENDING
+        ).delete(synchronize_session=False)
+        db.commit()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Grading queue is full, please retry shortly",
+            headers={"Retry-After": "5"}
+        )
+    return _accepted(assignment_id, SubmissionStatusResponse(
+        submission_id=submission_id,
+        status=SubmissionStatus.PENDING
+    ))
+
+
+@router.post(
+    "/{assignment_id}/submissions",
+    response_model=SubmissionResponse,
+    responses={202: {"model": SubmissionStatusResponse}}
+)
 async def submit_assignment(
     assignment_id: int,
     submission_data: SubmissionCreate,
     current_user: User = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None),
+    prefer: Optional[str] = Header(None)
 ):
+    """
+    Submit typed answers. Graded inline by default; with "Prefer: respond-async"
+    the submission is queued and 202 is returned with a Location to poll.
+    """
     # Verify assignment exists and student is enrolled
     assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
     if not assignment:
@@ -113,20 +227,169 @@ async def submit_assignment(
     if not enrolled:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enrolled in this classroom")
 
-    # Check if already submitted
-    existing = db.query(Submission).filter(
-        Submission.assignment_id == assignment_id,
-        Submission.student_id == current_user.id
-    ).first()
-    if existing:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Already submitted")
-
     # Convert AnswerSubmission objects to dict format for shared function
     answers_data = [
         {"question_id": a.question_id, "student_answer": a.student_answer}
         for a in submission_data.answers
     ]
     
-    # Use shared submission processing function
-    return await _process_submission(assignment_id, answers_data, current_user, db)
+    if prefer and "respond-async" in prefer and grading_queue.running:
+        return await _queue_submission(assignment_id, answers_data, current_user, db, idempotency_key)
+
+    # Use shared submission processing function; duplicates are caught by the
+    # unique constraint on (assignment_id, student_id)
+    return await _process_submission(assignment_id, answers_data, current_user, db, idempotency_key)
+
+
+@router.get("/{assignment_id}/submissions/{submission_id}/result", response_model=SubmissionStatusResponse)
+def get_submission_result(
+    assignment_id: int,
+    submission_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Poll the grading status of a submission; includes the graded result once ready."""
+    return _submission_status(db, _get_visible_submission(db, assignment_id, submission_id, current_user))
+
+
+@router.get("/{assignment_id}/submissions/{submission_id}/events")
+def submission_events(
+    assignment_id: int,
+    submission_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Server-sent events for a queued submission: "pending", "grading", then "graded" with
+    the scores (or "failed"). The stream ends once grading is over.
+    """
+    _get_visible_submission(db, assignment_id, submission_id, current_user)
+    db.close()  # The stream outlives the request session; don't hold its connection
+
+    def load():
+        db = SessionLocal()
+        try:
+            submission = db.query(Submission).filter(Submission.id == submission_id).first()
+            if not submission:
+                return None
+            final = submission.status not in (SubmissionStatus.PENDING, SubmissionStatus.GRADING)
+            return submission.status.value, _submission_status(db, submission).model_dump(mode="json"), final
+        finally:
+            db.close()
+
+    return event_stream(load)
+
 
+def _get_visible_submission(db: Session, assignment_id: int, submission_id: int, current_user: User) -> Submission:
+    submission = db.query(Submission).filter(
+        Submission.id == submission_id,
+        Submission.assignment_id == assignment_id
+    ).first()
+    if not submission:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Submission not found")
+
+    # Verify access: the submitting student OR the teacher who owns the classroom
+    if current_user.role == "student":
+        if submission.student_id != current_user.id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not your submission")
+    else:
+        owns = db.query(Classroom).join(Assignment, Assignment.classroom_id == Classroom.id).filter(
+            Assignment.id == assignment_id,
+            Classroom.teacher_id == current_user.id
+        ).first()
+        if not owns:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not your assignment")
+    return submission
+
+
+@router.post("/{assignment_id}/submissions/import", response_model=SubmissionImportResponse)
+async def import_submissions(
+    assignment_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_teacher),
+    db: Session = Depends(get_db)
+):
+    """
+    Import answers for a whole class (e.g. paper quizzes entered by the teacher).
+    Body is a JSON array or a CSV (Content-Type: text/csv) of
+    student_email, question_id, answer rows. Everything is written in one transaction.
+    """
+    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+    if not assignment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Assignment not found")
+
+    # Verify assignment belongs to teacher's classroom
+    classroom = db.query(Classroom).filter(
+        Classroom.id == assignment.classroom_id,
+        Classroom.teacher_id == current_user.id
+    ).first()
+    if not classroom:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not your assignment")
+
+    # Parse rows
+    body = await request.body()
+    try:
+        if "csv" in request.headers.get("content-type", ""):
+            raw_rows = list(csv.DictReader(io.StringIO(body.decode("utf-8-sig"))))
+        else:
+            raw_rows = json.loads(body)
+        rows = _import_rows.validate_python(raw_rows)
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid import data: {e}")
+
+    answers_by_email: Dict[str, List[SubmissionImportRow]] = {}
+    for row in rows:
+        answers_by_email.setdefault(row.student_email, []).append(row)
+
+    # Resolve enrolled students in one query
+    enrolled = db.query(User.id, User.email).join(
+        StudentProfile, StudentProfile.user_id == User.id
+    ).filter(
+        StudentProfile.classroom_id == assignment.classroom_id,
+        User.email.in_(answers_by_email.keys()),
+        User.role == "student"
+    ).all()
+    student_ids = {row.email: row.id for row in enrolled}
+
+    questions = db.query(Question).filter(Question.assignment_id == assignment_id).all()
+    required_question_ids = {q.id for q in questions}
+
+    results: Dict[str, SubmissionImportResult] = {}
+    answers_by_student: Dict[int, List[Dict]] = {}
+    for email, student_rows in answers_by_email.items():
+        question_ids = [r.question_id for r in student_rows]
+        if email not in student_ids:
+            results[email] = SubmissionImportResult(student_email=email, status="not_enrolled")
+        elif len(question_ids) != len(set(question_ids)) or set(question_ids) != required_question_ids:
+            results[email] = SubmissionImportResult(
+                student_email=email,
+                status="invalid",
+                detail="Must answer every question exactly once"
+            )
+        else:
+            answers_by_student[student_ids[email]] = [
+                {"question_id": r.question_id, "student_answer": r.answer}
+                for r in student_rows
+            ]
+
+    stored = bulk_grade_and_store(db, assignment_id, questions, answers_by_student)
+    db.commit()
+
+    emails_by_id = {student_id: email for email, student_id in student_ids.items()}
+    for student_id in answers_by_student:
+        email = emails_by_id[student_id]
+        if student_id in stored:
+            submission_id, total_score = stored[student_id]
+            results[email] = SubmissionImportResult(
+                student_email=email,
+                status="imported",
+                submission_id=submission_id,
+                total_score=total_score
+            )
+        else:
+            results[email] = SubmissionImportResult(student_email=email, status="already_submitted")
+
+    return SubmissionImportResponse(
+        imported=len(stored),
+        results=[results[email] for email in answers_by_email]
+    )
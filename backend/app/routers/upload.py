@@ -2,103 +2,170 @@
 File upload endpoint for OCR-based submissions.
 """
 import os
-import tempfile
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Header
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import User, Assignment, Submission, Answer, Question, StudentProfile
-from app.schemas import SubmissionResponse, AnswerResult
-from app.auth import get_current_student
-from app.grading import grade_answer
-from app.services.ocr import extract_text_from_file, clean_ocr_text
-from app.services.answer_extraction import extract_student_answers
+from app.database import get_db, SessionLocal
+from app.core.config import settings
+from app.models import User, Assignment, Question, StudentProfile, Classroom, Submission, SubmissionStatus, UploadJob, UploadJobStatus
+from app.schemas import SubmissionResponse, BatchUploadResult, BatchUploadResponse, UploadJobResponse
+from app.auth import get_current_student, get_current_teacher, get_current_user
+from app.routers.submissions import _process_submission, _replay_or_reject
+from app.services.ocr import extract_pdf_page_tokens
+from app.services.ocr_layout import tokens_to_text
+from app.services.ocr_pool import OCRBusyError
+from app.services.answer_extraction import extract_answers_from_tokens, extract_answers_from_file
+from app.services.submissions import bulk_grade_and_store, load_submission_response
+from app.services.upload_queue import upload_queue
+from app.services.events import event_stream
+from app.services.batch_upload import split_pages, read_header, unmatched_reason, StudentMatcher
+from app.services.uploads import save_upload, UploadTooLarge
 
 router = APIRouter()
 
 
-async def _process_submission(
+def _ocr_response(
+    submission_result: SubmissionResponse,
+    ocr_text: Optional[str],
+    extracted_answers: Optional[List[Dict]] = None
+) -> dict:
+    """Shape a graded submission like the typed endpoint, plus the OCR text and confidences."""
+    confidences = {a["question_id"]: a.get("confidence") for a in extracted_answers or []}
+    return {
+        "source": "ocr",
+        "submission_id": submission_result.submission_id,
+        "total_score": submission_result.total_score,
+        "answers": [
+            {
+                "answer_id": a.answer_id,
+                "question_id": a.question_id,
+                "student_answer": a.student_answer,
+                "correct_answer": a.correct_answer,
+                "ai_is_correct": a.ai_is_correct,
+                "ai_score": a.ai_score,
+                "confidence": confidences.get(a.question_id)
+            }
+            for a in submission_result.answers
+        ],
+        "ocr_text": ocr_text  # Include for debugging
+    }
+
+
+def _job_status(db: Session, job: UploadJob) -> UploadJobResponse:
+    result = None
+    if job.status == UploadJobStatus.DONE and job.submission_id:
+        submission = db.query(Submission).filter(Submission.id == job.submission_id).first()
+        if submission:
+            result = _ocr_response(load_submission_response(db, submission), job.ocr_text, job.extracted_answers)
+    return UploadJobResponse(
+        job_id=job.id,
+        status=job.status,
+        stage=job.stage,
+        attempts=job.attempts,
+        progress=job.progress,
+        error=job.last_error,
+        ocr_text=job.ocr_text,
+        answers=job.extracted_answers,
+        result=result
+    )
+
+
+def _has_submission(db: Session, assignment_id: int, student_id: int) -> bool:
+    """One-row check before OCR; a FAILED submission is replaced on insert."""
+    return db.query(Submission.id).filter(
+        Submission.assignment_id == assignment_id,
+        Submission.student_id == student_id,
+        Submission.status != SubmissionStatus.FAILED
+    ).first() is not None
+
+
+def _replay_response(replay: Union[SubmissionResponse, JSONResponse]):
+    """A stored result in the OCR shape; a still-queued submission keeps its 202 status."""
+    if isinstance(replay, JSONResponse):
+        return replay
+    return _ocr_response(replay, None)
+
+
+def _job_accepted(assignment_id: int, job_status: UploadJobResponse) -> JSONResponse:
+    """202 Accepted pointing at the job URL while the upload is being processed."""
+    status_code = status.HTTP_200_OK
+    if job_status.status in (UploadJobStatus.QUEUED, UploadJobStatus.PROCESSING):
+        status_code = status.HTTP_202_ACCEPTED
+    return JSONResponse(
+        status_code=status_code,
+        content=job_status.model_dump(mode="json"),
+        headers={"Location": f"/assignments/{assignment_id}/upload/jobs/{job_status.job_id}"}
+    )
+
+
+async def _queue_upload(
     assignment_id: int,
-    answers_data: list,
+    file: UploadFile,
+    file_ext: str,
     current_user: User,
-    db: Session
-) -> SubmissionResponse:
+    db: Session,
+    idempotency_key: Optional[str] = None
+) -> JSONResponse:
     """
-    Helper function to process submission (shared between typed and OCR submissions).
+    Persist the file and an upload job, then return immediately; OCR and grading
+    run in the background upload queue and survive restarts.
     """
-    # Get all questions for this assignment
-    questions = db.query(Question).filter(Question.assignment_id == assignment_id).all()
-    question_dict = {q.id: q for q in questions}
-    
-    # Validate all questions are answered
-    submitted_question_ids = {a["question_id"] for a in answers_data}
-    required_question_ids = {q.id for q in questions}
-    if submitted_question_ids != required_question_ids:
+    if idempotency_key:
+        job = db.query(UploadJob).filter(
+            UploadJob.assignment_id == assignment_id,
+            UploadJob.student_id == current_user.id,
+            UploadJob.idempotency_key == idempotency_key
+        ).order_by(UploadJob.id.desc()).first()
+        if job:
+            return _job_accepted(assignment_id, _job_status(db, job))
+
+    if _has_submission(db, assignment_id, current_user.id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Already submitted")
+
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    try:
+        file_path, content_hash = await save_upload(file, suffix=file_ext, directory=settings.UPLOAD_DIR)
+    except UploadTooLarge as e:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Must answer all questions"
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large. Maximum size is {e.max_bytes} bytes"
         )
-    
-    # Create submission
-    submission = Submission(
+
+    job = UploadJob(
         assignment_id=assignment_id,
-        student_id=current_user.id
+        student_id=current_user.id,
+        file_path=file_path,
+        content_hash=content_hash,
+        idempotency_key=idempotency_key,
+        available_at=datetime.now(timezone.utc),
+        stage="received"
     )
-    db.add(submission)
-    db.commit()
-    db.refresh(submission)
-    
-    # Grade and save answers
-    answer_results = []
-    total_score = 0.0
-    num_questions = len(questions)
-    
-    for answer_data in answers_data:
-        question = question_dict[answer_data["question_id"]]
-        is_correct, score = grade_answer(
-            question.question_type,
-            question.correct_answer,
-            answer_data["student_answer"]
-        )
-        
-        answer = Answer(
-            submission_id=submission.id,
-            question_id=answer_data["question_id"],
-            student_answer=answer_data["student_answer"],
-            ai_score=score,
-            ai_is_correct=is_correct
-        )
-        db.add(answer)
-        total_score += score
-        
-        answer_results.append(AnswerResult(
-            question_id=answer_data["question_id"],
-            student_answer=answer_data["student_answer"],
-            correct_answer=question.correct_answer,
-            ai_is_correct=is_correct,
-            ai_score=score
-        ))
-    
+    db.add(job)
     db.commit()
-    
-    avg_score = total_score / num_questions if num_questions > 0 else 0.0
-    
-    return SubmissionResponse(
-        submission_id=submission.id,
-        total_score=avg_score,
-        answers=answer_results
-    )
+    upload_queue.notify()
+    return _job_accepted(assignment_id, _job_status(db, job))
 
 
-@router.post("/{assignment_id}/upload", response_model=dict)
+@router.post(
+    "/{assignment_id}/upload",
+    response_model=dict,
+    responses={202: {"model": UploadJobResponse}}
+)
 async def upload_and_grade(
     assignment_id: int,
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None),
+    prefer: Optional[str] = Header(None)
 ):
     """
     Upload an image or PDF, extract text via OCR, extract answers, and grade.
     Returns submission results similar to typed submission.
+    With "Prefer: respond-async" the upload is queued and 202 is returned with
+    a Location to poll.
     """
     # Verify assignment exists and student is enrolled
     assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
@@ -112,13 +179,10 @@ async def upload_and_grade(
     if not enrolled:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enrolled in this classroom")
     
-    # Check if already submitted
-    existing = db.query(Submission).filter(
-        Submission.assignment_id == assignment_id,
-        Submission.student_id == current_user.id
-    ).first()
-    if existing:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Already submitted")
+    # A duplicate or a retry of a stored upload is answered before paying for OCR.
+    # Concurrent duplicates are still rejected by the unique constraint.
+    if _has_submission(db, assignment_id, current_user.id):
+        return _replay_response(_replay_or_reject(assignment_id, current_user, idempotency_key, db))
     
     # Validate file type
     allowed_extensions = ['.png', '.jpg', '.jpeg', '.pdf', '.gif', '.bmp', '.tiff']
@@ -129,20 +193,14 @@ async def upload_and_grade(
             detail=f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}"
         )
     
+    if prefer and "respond-async" in prefer and upload_queue.running:
+        return await _queue_upload(assignment_id, file, file_ext, current_user, db, idempotency_key)
+    
     # Save file temporarily
     temp_file = None
     try:
-        # Create temp file
-        suffix = file_ext
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            temp_file = tmp.name
-            # Read and write file content
-            content = await file.read()
-            tmp.write(content)
-        
-        # Extract text using OCR
-        raw_text = await extract_text_from_file(temp_file)
-        cleaned_text = clean_ocr_text(raw_text)
+        # Stream to a temp file in chunks, hashing on the way
+        temp_file, content_hash = await save_upload(file, suffix=file_ext)
         
         # Get assignment questions
         questions = db.query(Question).filter(Question.assignment_id == assignment_id).order_by(Question.id).all()
@@ -153,35 +211,36 @@ async def upload_and_grade(
                 detail="Assignment has no questions"
             )
         
-        # Extract answers from OCR text
-        answers_data = extract_student_answers(cleaned_text, questions)
+        answers_data, cleaned_text = await extract_answers_from_file(
+            temp_file, content_hash, questions, assignment.layout_template
+        )
         
         # Process submission using existing logic
         submission_result = await _process_submission(
             assignment_id,
             answers_data,
             current_user,
-            db
+            db,
+            idempotency_key
         )
+        if isinstance(submission_result, JSONResponse):
+            return submission_result
         
-        return {
-            "source": "ocr",
-            "submission_id": submission_result.submission_id,
-            "total_score": submission_result.total_score,
-            "answers": [
-                {
-                    "answer_id": a.answer_id,
-                    "question_id": a.question_id,
-                    "student_answer": a.student_answer,
-                    "correct_answer": a.correct_answer,
-                    "ai_is_correct": a.ai_is_correct,
-                    "ai_score": a.ai_score
-                }
-                for a in submission_result.answers
-            ],
-            "ocr_text": cleaned_text  # Include for debugging
-        }
+        return _ocr_response(submission_result, cleaned_text, answers_data)
     
+    except HTTPException:
+        raise
+    except UploadTooLarge as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large. Maximum size is {e.max_bytes} bytes"
+        )
+    except OCRBusyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="OCR is busy, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -197,3 +256,169 @@ async def upload_and_grade(
         if temp_file and os.path.exists(temp_file):
             os.unlink(temp_file)
 
+
+@router.get("/{assignment_id}/upload/jobs/{job_id}", response_model=UploadJobResponse)
+def get_upload_job(
+    assignment_id: int,
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Poll a queued upload; includes the graded result once done."""
+    return _job_status(db, _get_visible_job(db, assignment_id, job_id, current_user))
+
+
+@router.get("/{assignment_id}/upload/jobs/{job_id}/events")
+def upload_job_events(
+    assignment_id: int,
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Server-sent events for a queued upload. Each event carries the job state:
+    "received", "ocr" (with page progress), "extracted" (OCR text and answers),
+    then "graded" (scores) or "failed". The stream ends after the last one.
+    """
+    _get_visible_job(db, assignment_id, job_id, current_user)
+    db.close()  # The stream outlives the request session; don't hold its connection
+
+    def load():
+        db = SessionLocal()
+        try:
+            job = db.query(UploadJob).filter(UploadJob.id == job_id).first()
+            if not job:
+                return None
+            event = "failed" if job.status == UploadJobStatus.DEAD else job.stage
+            final = job.status in (UploadJobStatus.DONE, UploadJobStatus.DEAD)
+            return event, _job_status(db, job).model_dump(mode="json"), final
+        finally:
+            db.close()
+
+    return event_stream(load)
+
+
+def _get_visible_job(db: Session, assignment_id: int, job_id: int, current_user: User) -> UploadJob:
+    job = db.query(UploadJob).filter(
+        UploadJob.id == job_id,
+        UploadJob.assignment_id == assignment_id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload job not found")
+
+    # Verify access: the uploading student OR the teacher who owns the classroom
+    if current_user.role == "student":
+        if job.student_id != current_user.id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not your upload")
+    else:
+        owns = db.query(Classroom).join(Assignment, Assignment.classroom_id == Classroom.id).filter(
+            Assignment.id == assignment_id,
+            Classroom.teacher_id == current_user.id
+        ).first()
+        if not owns:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not your assignment")
+    return job
+
+
+@router.post("/{assignment_id}/upload/batch", response_model=BatchUploadResponse)
+async def upload_batch(
+    assignment_id: int,
+    file: UploadFile = File(...),
+    pages_per_student: Optional[int] = Form(None, ge=1),
+    current_user: User = Depends(get_current_teacher),
+    db: Session = Depends(get_db)
+):
+    """
+    Upload one scanned PDF holding a whole class's worksheets.
+    Pages are split per student (every pages_per_student pages, or at each page
+    with a "Name:"/"ID:"/"Email:" line), OCR'd in parallel, matched to enrolled
+    students by name or email on that line and graded in one bulk write.
+    """
+    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+    if not assignment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Assignment not found")
+
+    # Verify assignment belongs to teacher's classroom
+    classroom = db.query(Classroom).filter(
+        Classroom.id == assignment.classroom_id,
+        Classroom.teacher_id == current_user.id
+    ).first()
+    if not classroom:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not your assignment")
+
+    if os.path.splitext(file.filename)[1].lower() != ".pdf":
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Batch upload must be a PDF")
+
+    questions = db.query(Question).filter(Question.assignment_id == assignment_id).order_by(Question.id).all()
+    if not questions:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Assignment has no questions")
+
+    temp_file = None
+    try:
+        temp_file, _ = await save_upload(file, suffix=".pdf")
+        page_tokens = await extract_pdf_page_tokens(temp_file)
+    except UploadTooLarge as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large. Maximum size is {e.max_bytes} bytes"
+        )
+    except OCRBusyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="OCR is busy, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"OCR processing failed: {str(e)}"
+        )
+    finally:
+        if temp_file and os.path.exists(temp_file):
+            os.unlink(temp_file)
+
+    # Enrolled students of the classroom in one query
+    enrolled = db.query(User.id, User.name, User.email).join(
+        StudentProfile, StudentProfile.user_id == User.id
+    ).filter(
+        StudentProfile.classroom_id == assignment.classroom_id,
+        User.role == "student"
+    ).all()
+    matcher = StudentMatcher(enrolled)
+    emails = {row.id: row.email for row in enrolled}
+
+    page_texts = [tokens_to_text(tokens) for tokens in page_tokens]
+    results: List[BatchUploadResult] = []
+    answers_by_student: Dict[int, List[Dict]] = {}
+    result_by_student: Dict[int, BatchUploadResult] = {}
+    for pages in split_pages(page_texts, pages_per_student):
+        page_numbers = [i + 1 for i in pages]
+        header = read_header(page_texts[pages[0]] or "")
+        student_id = matcher.match(header)
+        if student_id is None:
+            results.append(BatchUploadResult(
+                pages=page_numbers,
+                status="unmatched",
+                detail=unmatched_reason(header)
+            ))
+            continue
+        result = BatchUploadResult(pages=page_numbers, status="graded", student_id=student_id, student_email=emails[student_id])
+        results.append(result)
+        if student_id in answers_by_student:
+            result.status = "duplicate"
+            result.detail = f"Student already matched pages {result_by_student[student_id].pages}"
+            continue
+        student_tokens = [token for i in pages for token in page_tokens[i]]
+        answers_by_student[student_id] = extract_answers_from_tokens(student_tokens, questions)
+        result_by_student[student_id] = result
+
+    stored = bulk_grade_and_store(db, assignment_id, questions, answers_by_student)
+    db.commit()
+
+    for student_id, result in result_by_student.items():
+        if student_id in stored:
+            result.submission_id, result.total_score = stored[student_id]
+        else:
+            result.status = "already_submitted"
+
+    return BatchUploadResponse(graded=len(stored), results=results)
@@ -1,7 +1,17 @@
 from app.schemas.user import UserCreate, UserResponse, Token, LoginRequest
-from app.schemas.classroom import ClassroomCreate, ClassroomResponse, AddStudentRequest, StudentInClassroom, StudentProfileResponse
-from app.schemas.assignment import AssignmentCreate, AssignmentResponse, QuestionCreate, QuestionResponse, AssignmentWithQuestions, AssignmentStatusUpdate
-from app.schemas.submission import SubmissionCreate, SubmissionResponse, AnswerSubmission, AnswerResponse
+from app.schemas.classroom import (
+    ClassroomCreate, ClassroomResponse, AddStudentRequest, StudentInClassroom, StudentProfileResponse,
+    BulkAddStudentsRequest, BulkEnrollmentResult, BulkEnrollmentResponse
+)
+from app.schemas.assignment import (
+    AssignmentCreate, AssignmentResponse, QuestionCreate, QuestionResponse, AssignmentWithQuestions, AssignmentStatusUpdate,
+    AssignmentCloneRequest, LayoutRegion, LayoutTemplate
+)
+from app.schemas.submission import (
+    SubmissionCreate, SubmissionResponse, AnswerSubmission, ExtractedAnswer, AnswerResponse, SubmissionStatusResponse,
+    SubmissionImportRow, SubmissionImportResult, SubmissionImportResponse,
+    BatchUploadResult, BatchUploadResponse, UploadJobResponse
+)
 # Alias for backward compatibility
 AnswerResult = AnswerResponse
 from app.schemas.analytics import ClassroomAnalytics, StudentSummary, AssignmentSummary, TopicPerformance, HardestQuestion, RecommendedPractice
@@ -25,6 +35,9 @@ __all__ = [
     "ClassroomCreate",
     "ClassroomResponse",
     "AddStudentRequest",
+    "BulkAddStudentsRequest",
+    "BulkEnrollmentResult",
+    "BulkEnrollmentResponse",
     "StudentInClassroom",
     "AssignmentCreate",
     "AssignmentResponse",
@@ -32,9 +45,20 @@ __all__ = [
     "QuestionResponse",
     "AssignmentWithQuestions",
     "AssignmentStatusUpdate",
+    "AssignmentCloneRequest",
+    "LayoutRegion",
+    "LayoutTemplate",
     "SubmissionCreate",
     "SubmissionResponse",
+    "SubmissionStatusResponse",
+    "SubmissionImportRow",
+    "SubmissionImportResult",
+    "SubmissionImportResponse",
+    "BatchUploadResult",
+    "BatchUploadResponse",
+    "UploadJobResponse",
     "AnswerSubmission",
+    "ExtractedAnswer",
     "AnswerResponse",
     "AnswerResult",
     "ClassroomAnalytics",
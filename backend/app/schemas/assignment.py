@@ -1,9 +1,26 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field, field_validator
+from typing import Optional, List, Tuple
 from datetime import datetime
 from app.models.assignment import AssignmentStatus
 from app.models.question import QuestionType
 
+class LayoutRegion(BaseModel):
+    question_id: int
+    page: int = Field(0, ge=0)  # 0-based page of a PDF; images have only page 0
+    box: Tuple[float, float, float, float]  # x0, y0, x1, y1 as fractions of page width/height
+
+    @field_validator("box")
+    @classmethod
+    def check_box(cls, box):
+        x0, y0, x1, y1 = box
+        if not (0 <= x0 < x1 <= 1 and 0 <= y0 < y1 <= 1):
+            raise ValueError("box must satisfy 0 <= x0 < x1 <= 1 and 0 <= y0 < y1 <= 1")
+        return box
+
+class LayoutTemplate(BaseModel):
+    """Answer box of each question on a fixed-layout worksheet."""
+    regions: List[LayoutRegion]
+
 class AssignmentBase(BaseModel):
     title: str
     description: Optional[str] = None
@@ -17,6 +34,7 @@ class AssignmentResponse(AssignmentBase):
     classroom_id: int
     status: AssignmentStatus
     created_at: Optional[datetime] = None
+    layout_template: Optional[LayoutTemplate] = None
 
     class Config:
         from_attributes = True
@@ -43,3 +61,6 @@ class AssignmentStatusUpdate(BaseModel):
 class AssignmentWithQuestions(AssignmentResponse):
     questions: List[QuestionResponse] = []
 
+
+class AssignmentCloneRequest(BaseModel):
+    classroom_ids: List[int]
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, field_validator
-from typing import Optional, List
+from typing import Optional, List, Literal
 from datetime import datetime
 
 class ClassroomBase(BaseModel):
@@ -26,6 +26,18 @@ class ClassroomResponse(ClassroomBase):
 class AddStudentRequest(BaseModel):
     student_email: str
 
+class BulkAddStudentsRequest(BaseModel):
+    student_emails: List[str]
+
+class BulkEnrollmentResult(BaseModel):
+    student_email: str
+    status: Literal["enrolled", "already_enrolled", "not_found", "duplicate"]
+    profile_id: Optional[int] = None
+
+class BulkEnrollmentResponse(BaseModel):
+    enrolled: int
+    results: List[BulkEnrollmentResult]
+
 class StudentInClassroom(BaseModel):
     id: int
     name: str
@@ -1,11 +1,16 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Literal
 from datetime import datetime
+from app.models.submission import SubmissionStatus
+from app.models.upload_job import UploadJobStatus
 
 class AnswerSubmission(BaseModel):
     question_id: int
     student_answer: str
 
+class ExtractedAnswer(AnswerSubmission):
+    confidence: Optional[float] = None  # OCR confidence of the least certain word, 0-1
+
 class SubmissionCreate(BaseModel):
     answers: List[AnswerSubmission]
 
@@ -30,3 +35,48 @@ class SubmissionResponse(BaseModel):
     total_score: float
     answers: List[AnswerResponse]
 
+
+class SubmissionStatusResponse(BaseModel):
+    submission_id: int
+    status: SubmissionStatus
+    result: Optional[SubmissionResponse] = None  # Present once graded
+
+class SubmissionImportRow(BaseModel):
+    student_email: str
+    question_id: int
+    answer: str
+
+class SubmissionImportResult(BaseModel):
+    student_email: str
+    status: Literal["imported", "not_enrolled", "already_submitted", "invalid"]
+    submission_id: Optional[int] = None
+    total_score: Optional[float] = None
+    detail: Optional[str] = None
+
+class SubmissionImportResponse(BaseModel):
+    imported: int
+    results: List[SubmissionImportResult]
+
+class BatchUploadResult(BaseModel):
+    pages: List[int]  # 1-based page numbers in the uploaded PDF
+    status: Literal["graded", "unmatched", "duplicate", "already_submitted"]
+    student_id: Optional[int] = None
+    student_email: Optional[str] = None
+    submission_id: Optional[int] = None
+    total_score: Optional[float] = None
+    detail: Optional[str] = None
+
+class BatchUploadResponse(BaseModel):
+    graded: int
+    results: List[BatchUploadResult]
+
+class UploadJobResponse(BaseModel):
+    job_id: int
+    status: UploadJobStatus
+    stage: str  # received, ocr, extracted or graded
+    attempts: int
+    progress: Optional[dict] = None  # {"done", "total"} pages while OCR runs
+    error: Optional[str] = None
+    ocr_text: Optional[str] = None  # Present once extracted
+    answers: Optional[List[ExtractedAnswer]] = None  # Extracted, before grading
+    result: Optional[dict] = None  # Same shape as a synchronous upload, once done
@@ -2,8 +2,35 @@
 Answer extraction service for parsing OCR text and matching answers to questions.
 """
 import re
-from typing import List, Dict
+from typing import Iterable, List, Dict, Optional, Tuple
 from app.models import Question
+from app.services.ocr import extract_tokens_from_file, extract_text_from_regions, clean_ocr_text, ProgressCallback
+from app.services.ocr_layout import OCRToken, group_lines, group_pages, tokens_to_text, typical_height
+
+
+# Question markers: "1." / "1)", "Q1" / "Q 1:", "Question 1:". A marker must start
+# at the beginning of the text or after whitespace, so every match attempt starts
+# at a new word and the scan stays linear however noisy the text is; "3.5" is a
+# decimal, not a marker. Groups: question/Q number, numbered-list number.
+QUESTION_MARKER = re.compile(
+    r'(?<!\S)(?:(?:question|q)\s*(\d+)(?:\s*[:\-.)])?|(\d+)[.)](?!\d))',
+    re.IGNORECASE
+)
+
+# When one question number appears with several marker styles, "1." wins over "Q1"
+# wins over "Question 1"
+_NUMBERED, _Q, _QUESTION = 0, 1, 2
+
+# Words further apart than this many line heights are in different columns
+COLUMN_GAP_LINES = 3.0
+
+
+def _marker(match: "re.Match") -> Tuple[int, int]:
+    """(question number, marker kind) of a QUESTION_MARKER match."""
+    if match.group(2) is not None:
+        return int(match.group(2)), _NUMBERED
+    kind = _QUESTION if match.group(0)[:2].lower() == "qu" else _Q
+    return int(match.group(1)), kind
 
 
 def extract_student_answers(raw_text: str, assignment_questions: List[Question]) -> List[Dict[str, str]]:
@@ -11,68 +38,141 @@ def extract_student_answers(raw_text: str, assignment_questions: List[Question])
     Given OCR text and the assignment questions, return
     [{question_id, student_answer}]
     
-    Uses regex to find patterns like:
+    Finds question markers like:
     - 1. Answer text
     - 1) Answer text
     - Q1 Answer text
     - Question 1: Answer text
+    in one pass; a question's answer is the first line of text after its marker,
+    up to the next marker.
     """
-    # Normalize text: lowercase for matching, but preserve original for answers
-    normalized_text = raw_text.lower()
-    answers = []
-    
-    # Create a mapping of question numbers to question objects
-    question_map = {i + 1: q for i, q in enumerate(assignment_questions)}
-    
-    # Pattern 1: "1. Answer" or "1) Answer"
-    pattern1 = re.compile(r'(\d+)[\.\)]\s*(.+?)(?=\d+[\.\)]|$)', re.DOTALL | re.MULTILINE)
-    
-    # Pattern 2: "Q1 Answer" or "Q 1 Answer"
-    pattern2 = re.compile(r'q\s*(\d+)\s*[:\-]?\s*(.+?)(?=q\s*\d+|$)', re.DOTALL | re.MULTILINE | re.IGNORECASE)
+    # Numbers that are no question ("3." in "Q1: 3.") are answer text, not segment ends
+    markers = [m for m in QUESTION_MARKER.finditer(raw_text)
+               if 1 <= _marker(m)[0] <= len(assignment_questions)]
+    found_answers: Dict[int, Tuple[int, str]] = {}
     
-    # Pattern 3: "Question 1: Answer"
-    pattern3 = re.compile(r'question\s*(\d+)\s*[:\-]?\s*(.+?)(?=question\s*\d+|$)', re.DOTALL | re.MULTILINE | re.IGNORECASE)
-    
-    found_answers = {}
-    
-    # Try pattern 1 first (most common: "1. Answer")
-    for match in pattern1.finditer(raw_text):
-        q_num = int(match.group(1))
-        answer_text = match.group(2).strip()
-        if q_num in question_map and answer_text:
-            found_answers[q_num] = answer_text
-    
-    # Try pattern 2 ("Q1 Answer")
-    if len(found_answers) < len(assignment_questions):
-        for match in pattern2.finditer(raw_text):
-            q_num = int(match.group(1))
-            answer_text = match.group(2).strip()
-            if q_num in question_map and q_num not in found_answers and answer_text:
-                found_answers[q_num] = answer_text
-    
-    # Try pattern 3 ("Question 1: Answer")
-    if len(found_answers) < len(assignment_questions):
-        for match in pattern3.finditer(raw_text):
-            q_num = int(match.group(1))
-            answer_text = match.group(2).strip()
-            if q_num in question_map and q_num not in found_answers and answer_text:
-                found_answers[q_num] = answer_text
+    for index, marker in enumerate(markers):
+        q_num, kind = _marker(marker)
+        if q_num in found_answers and found_answers[q_num][0] <= kind:
+            continue
+
+        end = markers[index + 1].start() if index + 1 < len(markers) else len(raw_text)
+        segment = raw_text[marker.end():end].lstrip()
+        # Clean up answer: first line only, whitespace collapsed
+        answer = " ".join(segment.split("\n", 1)[0].split())
+        if answer:
+            found_answers[q_num] = (kind, answer)
     
-    # Build answer list in question order
-    for i, question in enumerate(assignment_questions):
-        q_num = i + 1
-        student_answer = found_answers.get(q_num, "").strip()
-        
-        # Clean up answer: remove excessive whitespace, newlines
-        student_answer = re.sub(r'\s+', ' ', student_answer)
-        student_answer = student_answer.strip()
-        
-        answers.append({
+    return [
+        {
             "question_id": question.id,
-            "student_answer": student_answer
-        })
+            "student_answer": found_answers[i + 1][1] if i + 1 in found_answers else ""
+        }
+        for i, question in enumerate(assignment_questions)
+    ]
+
+
+def extract_answers_from_tokens(
+    tokens: Iterable[OCRToken],
+    assignment_questions: List[Question]
+) -> List[Dict]:
+    """
+    Layout-aware extraction from positioned OCR tokens. Returns
+    [{question_id, student_answer, confidence}]; confidence is that of the least
+    certain word in the answer (0-1), None when no answer was found.
     
-    return answers
+    Tokens are grouped into lines, and question markers (same styles as
+    extract_student_answers) are found per line. A marker's answer is the words
+    to its right up to the next marker on the line, so two-column sheets work;
+    a wide gap ends it. A marker with nothing beside it takes the words on the
+    next line below that start in its column.
+    """
+    found_answers: Dict[int, Tuple[int, str, float]] = {}
+
+    def record(q_num: int, kind: int, words: List[Tuple[str, float]]) -> None:
+        answer = " ".join(" ".join(text for text, _ in words).split())
+        if answer and (q_num not in found_answers or kind < found_answers[q_num][0]):
+            found_answers[q_num] = (kind, answer, min(confidence for _, confidence in words))
+
+    for page_tokens in group_pages(tokens).values():
+        line_height = typical_height(page_tokens)
+        max_gap = COLUMN_GAP_LINES * line_height
+        # Markers with nothing beside them, waiting for the next line: (q_num, kind, x0)
+        pending: List[Tuple[int, int, float]] = []
+
+        for line in group_lines(page_tokens):
+            text, spans = _join_line(line)
+            markers = [m for m in QUESTION_MARKER.finditer(text)
+                       if 1 <= _marker(m)[0] <= len(assignment_questions)]
+            first_marker = markers[0].start() if markers else len(text)
+
+            # Words left of this line's first marker answer markers above
+            below: Dict[int, List[Tuple[str, float]]] = {}
+            for token, (start, end) in zip(line, spans):
+                if end > first_marker:
+                    break
+                columns = [i for i, (_, _, x0) in enumerate(pending) if x0 <= token.center_x + line_height]
+                if columns:
+                    owner = max(columns, key=lambda i: pending[i][2])
+                    below.setdefault(owner, []).append((token.text, token.confidence))
+            for index, words in below.items():
+                record(pending[index][0], pending[index][1], words)
+            pending = [p for i, p in enumerate(pending) if i not in below]
+
+            for index, match in enumerate(markers):
+                q_num, kind = _marker(match)
+                end_of_answer = markers[index + 1].start() if index + 1 < len(markers) else len(text)
+                words = _words_between(line, spans, match.end(), end_of_answer, max_gap)
+                x0 = next(t.box[0] for t, (_, end) in zip(line, spans) if end > match.start())
+                # A new marker in the same column ends the wait of the one above it
+                pending = [p for p in pending if abs(p[2] - x0) > line_height]
+                if words:
+                    record(q_num, kind, words)
+                else:
+                    pending.append((q_num, kind, x0))
+
+    return [
+        {
+            "question_id": question.id,
+            "student_answer": found_answers[i + 1][1] if i + 1 in found_answers else "",
+            "confidence": round(found_answers[i + 1][2], 3) if i + 1 in found_answers else None
+        }
+        for i, question in enumerate(assignment_questions)
+    ]
+
+
+def _join_line(line: List[OCRToken]) -> Tuple[str, List[Tuple[int, int]]]:
+    """The line's text with single spaces between tokens, and each token's span in it."""
+    spans = []
+    position = 0
+    for token in line:
+        spans.append((position, position + len(token.text)))
+        position += len(token.text) + 1
+    return " ".join(t.text for t in line), spans
+
+
+def _words_between(
+    line: List[OCRToken],
+    spans: List[Tuple[int, int]],
+    start: int,
+    end: int,
+    max_gap: float
+) -> List[Tuple[str, float]]:
+    """(text, confidence) of the line's tokens within [start, end), stopping at a column gap."""
+    words = []
+    previous_x1 = None
+    for token, (token_start, token_end) in zip(line, spans):
+        if token_end <= start or token_start >= end:
+            continue
+        # One token can hold both the marker and the answer, e.g. "1.x=2"
+        text = token.text[max(start - token_start, 0):end - token_start].strip()
+        if not text:
+            continue
+        if previous_x1 is not None and token.box[0] - previous_x1 > max_gap:
+            break
+        words.append((text, token.confidence))
+        previous_x1 = token.box[2]
+    return words
 
 
 def extract_answers_simple(raw_text: str, num_questions: int) -> List[str]:
@@ -92,3 +192,37 @@ def extract_answers_simple(raw_text: str, num_questions: int) -> List[str]:
     
     return lines
 
+
+async def extract_answers_from_file(
+    file_path: str,
+    content_hash: str,
+    questions: List[Question],
+    layout_template: Optional[Dict] = None,
+    progress: Optional[ProgressCallback] = None
+) -> Tuple[List[Dict], str]:
+    """
+    OCR an uploaded worksheet and return
+    ([{question_id, student_answer, confidence}], cleaned text).
+    With a layout template only the answer boxes are read and mapped straight to
+    questions (no confidence); otherwise the whole page is OCR'd and answers are
+    placed by position (see extract_answers_from_tokens).
+    progress is passed on to the OCR service.
+    """
+    if layout_template:
+        region_texts = await extract_text_from_regions(
+            file_path, layout_template["regions"], content_hash, progress
+        )
+        answers = [
+            {
+                "question_id": q.id,
+                # Raw text: clean_ocr_text's letter fixes would turn "100" into "1OO"
+                "student_answer": " ".join(region_texts.get(q.id, "").split()),
+                "confidence": None
+            }
+            for q in questions
+        ]
+        return answers, "\n".join(a["student_answer"] for a in answers)
+
+    # Cached by content, so re-uploads skip OCR
+    tokens = await extract_tokens_from_file(file_path, content_hash, progress)
+    return extract_answers_from_tokens(tokens, questions), clean_ocr_text(tokens_to_text(tokens))
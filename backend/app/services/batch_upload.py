@@ -0,0 +1,90 @@
+"""
+Splitting a whole-class scan into per-student page groups.
+
+Teachers scan a stack of worksheets into one PDF. Pages are grouped either by a
+fixed page count per student or by the name/ID line at the top of each sheet:
+a page whose header names a student starts a new group, pages without one belong
+to the group before them. Each group is then matched to an enrolled student by
+name or email. Users have no school student-ID field, and matching an "ID:" line
+against the database id would silently grade the sheet as someone else's, so
+such groups are reported as unmatched.
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# "Name: Jane Doe", "Student ID: 42", "Email - jane@school.edu" within the first lines of a page
+HEADER_PATTERN = re.compile(
+    r'^\s*(?:student\s*)?(name|id|email|e-mail)\s*(?:[:#\-]\s*|\s+)(\S.*?)\s*$',
+    re.IGNORECASE | re.MULTILINE
+)
+HEADER_LINES = 5
+
+
+def read_header(page_text: str) -> Optional[Tuple[str, str]]:
+    """Return (field, value) of the name/ID line at the top of a page, if any."""
+    head = "\n".join(page_text.strip().splitlines()[:HEADER_LINES])
+    match = HEADER_PATTERN.search(head)
+    if not match:
+        return None
+    field = match.group(1).lower().replace("-", "")
+    return field, match.group(2)
+
+
+def split_pages(page_texts: List[str], pages_per_student: Optional[int] = None) -> List[List[int]]:
+    """
+    Group page indexes per student: fixed-size chunks when pages_per_student is
+    given, otherwise a new group at every page with a name/ID header.
+    """
+    if not page_texts:
+        return []
+    if pages_per_student:
+        return [
+            list(range(start, min(start + pages_per_student, len(page_texts))))
+            for start in range(0, len(page_texts), pages_per_student)
+        ]
+
+    groups: List[List[int]] = []
+    for index, text in enumerate(page_texts):
+        if not groups or read_header(text or "") is not None:
+            groups.append([index])
+        else:
+            groups[-1].append(index)
+    return groups
+
+
+def _normalize(value: str) -> str:
+    return " ".join(value.lower().split())
+
+
+def unmatched_reason(header: Optional[Tuple[str, str]]) -> str:
+    """Explain to the teacher why a page group was not matched to a student."""
+    if header is None:
+        return "No name/ID line found"
+    field, value = header
+    if field == "id" and "@" not in value:
+        return f"Student ID '{value}' cannot be matched; write the student's name or email"
+    return f"No enrolled student for '{value}'"
+
+
+class StudentMatcher:
+    """Resolve a page header to an enrolled student's user id."""
+
+    def __init__(self, students: Iterable[Tuple[int, str, str]]):
+        self._by_email: Dict[str, int] = {}
+        names: Dict[str, List[int]] = {}
+        for student_id, name, email in students:
+            self._by_email[email.lower()] = student_id
+            names.setdefault(_normalize(name), []).append(student_id)
+        # Names shared by two enrolled students cannot identify either one
+        self._by_name = {name: ids[0] for name, ids in names.items() if len(ids) == 1}
+
+    def match(self, header: Optional[Tuple[str, str]]) -> Optional[int]:
+        if header is None:
+            return None
+        field, value = header
+        value = value.strip()
+        if "@" in value:
+            return self._by_email.get(value.lower())
+        if field == "id":
+            return None
+        return self._by_name.get(_normalize(value))
@@ -0,0 +1,61 @@
+"""
+Server-sent events for long-running jobs.
+
+Job state lives in the database, so the stream re-reads it on an interval and
+sends one event per change; a client can follow a job handled by any API process.
+Comment lines keep idle connections open through proxies with short timeouts.
+"""
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Callable, Optional, Tuple
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
+
+# load() returns (event name, JSON-serializable payload, is final) or None if gone
+StateLoader = Callable[[], Optional[Tuple[str, dict, bool]]]
+
+
+def format_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_state(load: StateLoader) -> AsyncIterator[str]:
+    """Yield an event whenever the loaded state changes, until it is final."""
+    started = last_sent = time.monotonic()
+    last_state = None
+    while True:
+        state = await asyncio.to_thread(load)
+        if state is None:
+            yield format_event("error", {"detail": "Not found"})
+            return
+        event, data, final = state
+        if (event, data) != last_state:
+            yield format_event(event, data)
+            last_state = (event, data)
+            last_sent = time.monotonic()
+        if final:
+            return
+
+        now = time.monotonic()
+        if now - started > settings.EVENTS_MAX_SECONDS:
+            # Clients reconnect and get the current state as the first event
+            yield format_event("timeout", {})
+            return
+        if now - last_sent > settings.EVENTS_KEEPALIVE_SECONDS:
+            yield ": keepalive\n\n"
+            last_sent = now
+        await asyncio.sleep(settings.EVENTS_POLL_SECONDS)
+
+
+def event_stream(load: StateLoader) -> StreamingResponse:
+    return sse_response(stream_state(load))
+
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    """Send already formatted events, unbuffered by proxies."""
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,250 @@
+"""
+Accept-then-grade queue for typed submissions.
+
+Submissions sent with "Prefer: respond-async" are stored as PENDING with their raw
+answers and acknowledged with 202. A fixed number of asyncio workers drain the
+queue and run SymPy grading in a bounded process pool, so a deadline burst is
+absorbed by the queue instead of by request latency.
+
+Every API process re-queues PENDING submissions when it starts, so a worker
+claims a submission (GRADING, with a lease) before grading it and stores the
+result only while it still holds that lease: two processes never both store
+answers for one submission. A claim whose worker died expires after
+GRADING_LEASE_SECONDS and is picked up again on the next start. A grading
+process killed mid-task breaks the pool; it is replaced so only the submissions
+being graded at that moment fail, and a FAILED submission can be resubmitted.
+"""
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from sqlalchemy import and_, or_
+from app.core.config import settings
+from app.database import SessionLocal
+from app.grading import grade_answers
+from app.models import Submission, SubmissionStatus, Answer, Question
+from app.services import metrics
+
+
+class GradingQueueFull(Exception):
+    """Raised when the grading queue is at capacity."""
+
+
+class GradingQueue:
+    def __init__(self, workers: int, max_size: int):
+        self.workers = workers
+        self.max_size = max_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def running(self) -> bool:
+        return self._queue is not None
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def full(self) -> bool:
+        return self._queue is not None and self._queue.full()
+
+    async def start(self) -> None:
+        """Start workers and re-queue submissions left PENDING by a previous process."""
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        if self.workers > 0:
+            self._executor = self._new_executor()
+        self._tasks = [
+            asyncio.create_task(self._worker()) for _ in range(max(self.workers, 1))
+        ]
+        metrics.register_gauge("grading_queue_depth", self.depth)
+
+        for submission_id in await asyncio.to_thread(_pending_submission_ids):
+            try:
+                self.enqueue(submission_id)
+            except GradingQueueFull:
+                break
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers)
+
+    def _replace_broken(self, executor: ProcessPoolExecutor) -> None:
+        # Tasks failing together on one broken executor replace it only once
+        if self._executor is not executor:
+            return
+        print("Grading worker died, restarting the grading pool")
+        metrics.increment("grading_pool_restarts")
+        executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._new_executor()
+
+    async def _grade(self, items):
+        loop = asyncio.get_running_loop()
+        executor = self._executor
+        if executor is None:
+            return await loop.run_in_executor(None, grade_answers, items)
+        try:
+            future = loop.run_in_executor(executor, grade_answers, items)
+        except BrokenProcessPool:
+            # Broke before this task was sent; safe to send it to the new pool
+            self._replace_broken(executor)
+            executor = self._executor
+            future = loop.run_in_executor(executor, grade_answers, items)
+        try:
+            return await future
+        except BrokenProcessPool:
+            # This task may be what killed the worker, so it is not retried
+            self._replace_broken(executor)
+            raise
+
+    def enqueue(self, submission_id: int) -> None:
+        if self._queue is None:
+            raise RuntimeError("Grading queue is not running")
+        try:
+            self._queue.put_nowait(submission_id)
+        except asyncio.QueueFull:
+            raise GradingQueueFull()
+        metrics.increment("grading_jobs_enqueued")
+
+    async def _worker(self) -> None:
+        while True:
+            submission_id = await self._queue.get()
+            started = time.perf_counter()
+            lease = None
+            try:
+                claim = await asyncio.to_thread(_claim_items, submission_id)
+                if claim is not None:
+                    lease, items = claim
+                    results = await self._grade(items)
+                    await asyncio.to_thread(_store_results, submission_id, lease, results)
+                metrics.increment("grading_jobs_completed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Grading submission {submission_id} failed: {e}")
+                if lease is not None:
+                    await asyncio.to_thread(_mark_failed, submission_id, lease)
+                metrics.increment("grading_jobs_failed")
+            finally:
+                metrics.increment("grading_seconds_total", time.perf_counter() - started)
+                self._queue.task_done()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _claimable(now: datetime):
+    return or_(
+        Submission.status == SubmissionStatus.PENDING,
+        # The worker holding it died or was restarted
+        and_(Submission.status == SubmissionStatus.GRADING, Submission.locked_until < now)
+    )
+
+
+def _pending_submission_ids() -> List[int]:
+    db = SessionLocal()
+    try:
+        rows = db.query(Submission.id).filter(_claimable(_now())).order_by(Submission.id).all()
+        return [row.id for row in rows]
+    finally:
+        db.close()
+
+
+def _claim_items(submission_id: int):
+    """
+    Claim a pending submission for this worker. Returns (lease, picklable grading
+    items), or None if it is graded, failed or claimed by another worker.
+    """
+    db = SessionLocal()
+    try:
+        now = _now()
+        lease = now + timedelta(seconds=settings.GRADING_LEASE_SECONDS)
+        claimed = db.query(Submission).filter(Submission.id == submission_id, _claimable(now)).update({
+            Submission.status: SubmissionStatus.GRADING,
+            Submission.locked_until: lease,
+        }, synchronize_session=False)
+        db.commit()
+        if not claimed:
+            return None
+
+        submission = db.query(Submission).filter(Submission.id == submission_id).one()
+        questions = db.query(Question).filter(Question.assignment_id == submission.assignment_id).all()
+        question_dict = {q.id: q for q in questions}
+        items = [
+            (
+                question_dict[a["question_id"]].question_type,
+                question_dict[a["question_id"]].correct_answer,
+                a["student_answer"]
+            )
+            for a in submission.pending_answers
+        ]
+        return lease, items
+    finally:
+        db.close()
+
+
+def _store_results(submission_id: int, lease: datetime, results) -> None:
+    db = SessionLocal()
+    try:
+        submission = db.query(Submission).filter(Submission.id == submission_id).one()
+        pending_answers = submission.pending_answers
+        # Same transaction as the answers: only the lease holder can finish it
+        stored = db.query(Submission).filter(
+            Submission.id == submission_id,
+            Submission.status == SubmissionStatus.GRADING,
+            Submission.locked_until == lease
+        ).update({
+            Submission.status: SubmissionStatus.GRADED,
+            Submission.pending_answers: None,
+            Submission.locked_until: None,
+        }, synchronize_session=False)
+        if not stored:
+            db.rollback()
+            return
+        db.add_all([
+            Answer(
+                submission_id=submission_id,
+                question_id=answer_data["question_id"],
+                student_answer=answer_data["student_answer"],
+                ai_score=score,
+                ai_is_correct=is_correct
+            )
+            for answer_data, (is_correct, score) in zip(pending_answers, results)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def _mark_failed(submission_id: int, lease: datetime) -> None:
+    db = SessionLocal()
+    try:
+        # Fenced like _store_results: an expired claim must not fail a regrade
+        db.query(Submission).filter(
+            Submission.id == submission_id,
+            Submission.status == SubmissionStatus.GRADING,
+            Submission.locked_until == lease
+        ).update({
+            Submission.status: SubmissionStatus.FAILED,
+            Submission.locked_until: None,
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+grading_queue = GradingQueue(
+    workers=settings.GRADING_WORKERS,
+    max_size=settings.GRADING_QUEUE_SIZE
+)
@@ -1,9 +1,61 @@
 """
 LLM Feedback Service using Ollama (local, free).
 Generates explanations for student answers.
+
+All calls share one httpx.AsyncClient, opened in the app lifespan, so requests
+reuse pooled keep-alive connections instead of connecting every time.
+Ollama serves OLLAMA_NUM_PARALLEL generations at once and queues the rest, so
+a semaphore keeps this process from sending more than OLLAMA_MAX_PARALLEL.
 """
+import asyncio
 import httpx
 from typing import Optional
+from app.core.config import settings
+
+_client: Optional[httpx.AsyncClient] = None
+_slots: Optional[asyncio.Semaphore] = None  # Bounds concurrent generations to OLLAMA_MAX_PARALLEL
+
+
+def open_client() -> None:
+    """Create the shared Ollama client (called from the app lifespan)."""
+    global _client, _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(settings.OLLAMA_MAX_PARALLEL)
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=settings.OLLAMA_BASE_URL,
+            timeout=httpx.Timeout(settings.OLLAMA_TIMEOUT_SECONDS, connect=settings.OLLAMA_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                keepalive_expiry=settings.OLLAMA_KEEPALIVE_SECONDS
+            )
+        )
+
+
+async def close_client() -> None:
+    global _client, _slots
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _slots = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    # Scripts and tests that skip the lifespan get the client on first use
+    if _client is None:
+        open_client()
+    return _client
+
+
+def _get_slots() -> asyncio.Semaphore:
+    if _slots is None:
+        open_client()
+    return _slots
+
+
+class OllamaError(Exception):
+    """Ollama could not produce feedback; the message is meant for users."""
 
 
 async def generate_feedback_ollama(
@@ -11,7 +63,7 @@ async def generate_feedback_ollama(
     correct_answer: str,
     student_answer: str,
     is_correct: bool,
-    model: str = "mistral"
+    model: Optional[str] = None
 ) -> str:
     """
     Generate feedback using local Ollama instance.
@@ -21,10 +73,28 @@ async def generate_feedback_ollama(
         correct_answer: The correct answer
         student_answer: The student's answer
         is_correct: Whether the answer is correct
-        model: Ollama model name (mistral, llama2, phi3, gemma, etc.)
+        model: Ollama model name (mistral, llama2, phi3, gemma, etc.); defaults to OLLAMA_MODEL
     
     Returns:
-        Feedback text explaining the answer
+        Feedback text explaining the answer, or an "Error..." message
+    """
+    try:
+        return await request_feedback_ollama(question_text, correct_answer, student_answer, is_correct, model)
+    except OllamaError as e:
+        return str(e)
+
+
+async def request_feedback_ollama(
+    question_text: str,
+    correct_answer: str,
+    student_answer: str,
+    is_correct: bool,
+    model: Optional[str] = None
+) -> str:
+    """
+    Like generate_feedback_ollama, but raises OllamaError instead of returning
+    the error as feedback text. At most OLLAMA_MAX_PARALLEL generations run at
+    once; further calls wait for a slot.
     """
     prompt = f"""You are a friendly, concise middle-school tutor.
 
@@ -42,45 +112,47 @@ Keep it short (2-3 sentences), simple, and encouraging. Use a friendly tone.
 """
 
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "http://localhost:11434/api/generate",
+        async with _get_slots():
+            response = await _get_client().post(
+                "/api/generate",
                 json={
-                    "model": model,
+                    "model": model or settings.OLLAMA_MODEL,
                     "prompt": prompt,
                     "stream": False
                 }
             )
-            
-            if response.status_code == 200:
-                data = response.json()
-                feedback = data.get("response", "").strip()
-                return feedback
-            else:
-                return f"Error: Ollama returned status {response.status_code}. Make sure Ollama is running on localhost:11434"
+        
+        if response.status_code == 200:
+            data = response.json()
+            feedback = data.get("response", "").strip()
+            return feedback
+        else:
+            raise OllamaError(f"Error: Ollama returned status {response.status_code}. Make sure Ollama is running on {settings.OLLAMA_BASE_URL}")
     
-    except httpx.ConnectError:
-        return "Error: Could not connect to Ollama. Please make sure Ollama is running on localhost:11434. Install from https://ollama.ai"
+    except httpx.ConnectError as e:
+        raise OllamaError(f"Error: Could not connect to Ollama. Please make sure Ollama is running on {settings.OLLAMA_BASE_URL}. Install from https://ollama.ai") from e
     
-    except httpx.TimeoutException:
-        return "Error: Ollama request timed out. The model may be loading or too slow."
+    except httpx.TimeoutException as e:
+        raise OllamaError("Error: Ollama request timed out. The model may be loading or too slow.") from e
+    
+    except OllamaError:
+        raise
     
     except Exception as e:
-        return f"Error generating feedback: {str(e)}"
+        raise OllamaError(f"Error generating feedback: {str(e)}") from e
 
 
-async def check_ollama_available(model: str = "mistral") -> bool:
+async def check_ollama_available(model: Optional[str] = None) -> bool:
     """
     Check if Ollama is running and the model is available.
     """
+    model = model or settings.OLLAMA_MODEL
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get("http://localhost:11434/api/tags")
-            if response.status_code == 200:
-                models = response.json().get("models", [])
-                model_names = [m.get("name", "") for m in models]
-                return any(model in name for name in model_names)
-            return False
+        response = await _get_client().get("/api/tags", timeout=5.0)
+        if response.status_code == 200:
+            models = response.json().get("models", [])
+            model_names = [m.get("name", "") for m in models]
+            return any(model in name for name in model_names)
+        return False
     except:
         return False
-
@@ -0,0 +1,41 @@
+"""
+Minimal in-process metrics registry.
+Counters are incremented by services; gauges are read lazily when /metrics is scraped.
+"""
+import threading
+from typing import Callable, Dict
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, Callable[[], float]] = {}
+
+
+def increment(name: str, value: float = 1.0) -> None:
+    """Add value to a counter, creating it on first use."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0.0) + value
+
+
+def counters() -> Dict[str, float]:
+    """Return a copy of all counters (without gauges)."""
+    with _lock:
+        return dict(_counters)
+
+
+def register_gauge(name: str, read: Callable[[], float]) -> None:
+    """Register a callable that reports the current value of a gauge."""
+    with _lock:
+        _gauges[name] = read
+
+
+def snapshot() -> Dict[str, float]:
+    """Return current values of all counters and gauges."""
+    with _lock:
+        values = dict(_counters)
+        gauges = dict(_gauges)
+    for name, read in gauges.items():
+        try:
+            values[name] = float(read())
+        except Exception:
+            continue
+    return values
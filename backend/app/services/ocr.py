@@ -1,11 +1,26 @@
 """
 OCR Service for extracting text from images and PDFs.
-Supports EasyOCR (preferred) and Tesseract as fallback.
+Supports EasyOCR (preferred) and Tesseract as fallback. Tesseract runs in-process
+through tesserocr when installed, which is cheap enough to try first on clean
+printed sheets; pytesseract, which starts a tesseract binary per image, is the
+last resort.
 """
-import os
-import tempfile
-from typing import Optional
+import asyncio
+import json
+import math
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 from pathlib import Path
+import numpy as np
+from app.core.config import settings
+from app.services import metrics
+from app.services.ocr_cache import ocr_cache, hash_file
+from app.services.ocr_layout import OCRToken, tokens_to_text, tokens_to_json, tokens_from_json
+from app.services.ocr_pool import ocr_pool
+from app.services.ocr_preprocessing import preprocess_image, load_image
+from PIL import Image
 
 try:
     import easyocr
@@ -13,15 +28,20 @@ try:
 except ImportError:
     EASYOCR_AVAILABLE = False
 
+try:
+    import tesserocr
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    TESSEROCR_AVAILABLE = False
+
 try:
     import pytesseract
-    from PIL import Image
     TESSERACT_AVAILABLE = True
 except ImportError:
     TESSERACT_AVAILABLE = False
 
 try:
-    from pdf2image import convert_from_path
+    from pdf2image import convert_from_path, pdfinfo_from_path
     PDF2IMAGE_AVAILABLE = True
 except ImportError:
     PDF2IMAGE_AVAILABLE = False
@@ -33,84 +53,498 @@ except ImportError:
     PYMUPDF_AVAILABLE = False
 
 
-async def extract_text_from_file(file_path: str) -> str:
+# Awaited with (pages or regions done, total) as OCR advances
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
+
+class ReaderPool:
+    """
+    Fixed set of preloaded EasyOCR readers shared by the whole process.
+    Loading a Reader pulls the detection and recognition models from disk, so it
+    happens once at startup instead of per image. Borrowing blocks when all
+    readers are busy, which bounds OCR concurrency to the pool size.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._readers: "queue.Queue" = queue.Queue()
+
+    def fill(self, warmup: bool = True) -> None:
+        for _ in range(self.size):
+            reader = easyocr.Reader(settings.OCR_LANGUAGES, gpu=False)  # Use CPU for compatibility
+            if warmup:
+                # First inference initializes lazy torch state; pay for it at startup
+                reader.readtext(np.full((64, 256), 255, dtype=np.uint8))
+            self._readers.put(reader)
+
+    @contextmanager
+    def borrow(self):
+        reader = self._readers.get()
+        try:
+            yield reader
+        finally:
+            self._readers.put(reader)
+
+
+_reader_pool: Optional[ReaderPool] = None
+_reader_pool_lock = threading.Lock()
+
+
+def init_reader_pool(size: int = None, warmup: bool = None) -> None:
+    """Create and warm the process-wide reader pool (called from the app lifespan)."""
+    global _reader_pool
+    if not EASYOCR_AVAILABLE:
+        return
+    with _reader_pool_lock:
+        if _reader_pool is not None:
+            return
+        if settings.OCR_TORCH_THREADS:
+            import torch  # Installed with easyocr
+            # With several OCR processes per node, torch's default of one thread
+            # per core oversubscribes the CPU
+            torch.set_num_threads(settings.OCR_TORCH_THREADS)
+        pool = ReaderPool(size or settings.OCR_READER_POOL_SIZE)
+        pool.fill(settings.OCR_WARMUP if warmup is None else warmup)
+        _reader_pool = pool
+
+
+# One Tesseract engine per thread: the C API keeps per-image state and is not thread-safe
+_tesseract = threading.local()
+
+
+def init_tesseract() -> None:
+    """Load this thread's Tesseract engine ahead of the first image (called in OCR workers)."""
+    if not TESSEROCR_AVAILABLE:
+        return
+    try:
+        _tesseract_api()
+    except RuntimeError as e:
+        print(f"Tesseract engine unavailable: {e}")
+
+
+def _tesseract_api() -> "tesserocr.PyTessBaseAPI":
+    api = getattr(_tesseract, "api", None)
+    if api is None:
+        # Loads the traineddata once; raises RuntimeError if the language data is missing
+        api = tesserocr.PyTessBaseAPI(lang=settings.OCR_TESSERACT_LANGUAGES)
+        _tesseract.api = api
+    return api
+
+
+def _tesserocr_tokens(image: np.ndarray) -> List[OCRToken]:
+    """Recognize an in-memory image word by word."""
+    api = _tesseract_api()
+    api.SetImage(Image.fromarray(image))
+    try:
+        api.Recognize()
+        iterator = api.GetIterator()
+        if iterator is None:
+            return []
+        level = tesserocr.RIL.WORD
+        tokens = []
+        for word in tesserocr.iterate_level(iterator, level):
+            try:
+                text = (word.GetUTF8Text(level) or "").strip()
+            except RuntimeError:
+                # Raised instead of returning "" when the page has no text at all
+                continue
+            box = word.BoundingBox(level)
+            if text and box:
+                tokens.append(OCRToken(text, tuple(box), word.Confidence(level) / 100))
+        return tokens
+    finally:
+        api.Clear()
+
+
+def _pytesseract_tokens(image: np.ndarray) -> List[OCRToken]:
+    data = pytesseract.image_to_data(Image.fromarray(image), output_type=pytesseract.Output.DICT)
+    tokens = []
+    for text, conf, left, top, width, height in zip(
+        data["text"], data["conf"], data["left"], data["top"], data["width"], data["height"]
+    ):
+        # Block and line rows carry no text and a confidence of -1
+        if text.strip() and float(conf) >= 0:
+            tokens.append(OCRToken(text.strip(), (left, top, left + width, top + height), float(conf) / 100))
+    return tokens
+
+
+def _easyocr_tokens(image: np.ndarray) -> List[OCRToken]:
+    with _get_reader_pool().borrow() as reader:
+        results = reader.readtext(image)
+    tokens = []
+    for corners, text, confidence in results:
+        xs = [float(x) for x, _ in corners]
+        ys = [float(y) for _, y in corners]
+        tokens.append(OCRToken(text, (min(xs), min(ys), max(xs), max(ys)), float(confidence)))
+    return tokens
+
+
+def _get_reader_pool() -> ReaderPool:
+    # Scripts and tests that skip the lifespan get a single lazily loaded reader
+    if _reader_pool is None:
+        init_reader_pool(size=1, warmup=False)
+    return _reader_pool
+
+
+def ocr_fingerprint() -> str:
+    """
+    Identifies everything besides the file bytes that influences OCR output.
+    Part of the cache key, so upgrading an engine or changing a setting
+    never serves stale text.
+    """
+    return json.dumps({
+        "easyocr": getattr(easyocr, "__version__", None) if EASYOCR_AVAILABLE else None,
+        "tesseract": getattr(pytesseract, "__version__", None) if TESSERACT_AVAILABLE else None,
+        "tesserocr": tesserocr.tesseract_version().splitlines()[0] if TESSEROCR_AVAILABLE else None,
+        "tesseract_languages": settings.OCR_TESSERACT_LANGUAGES,
+        "tesseract_first_pass": settings.OCR_TESSERACT_FIRST_PASS and settings.OCR_TESSERACT_MIN_CONFIDENCE,
+        "pymupdf": fitz.VersionBind if PYMUPDF_AVAILABLE else None,
+        "pdf2image": PDF2IMAGE_AVAILABLE,
+        "languages": settings.OCR_LANGUAGES,
+        "pdf_dpi": settings.OCR_PDF_DPI,
+        "format": "tokens",  # Entries hold recognized words with boxes, not flat text
+        "min_page_text_chars": settings.OCR_MIN_PAGE_TEXT_CHARS,
+        "max_page_image_coverage": settings.OCR_MAX_PAGE_IMAGE_COVERAGE,
+        "preprocess": {
+            "downscale": settings.OCR_PREPROCESS_DOWNSCALE and settings.OCR_PREPROCESS_TARGET_DPI,
+            "grayscale": settings.OCR_PREPROCESS_GRAYSCALE,
+            "binarize": settings.OCR_PREPROCESS_BINARIZE and [
+                settings.OCR_BINARIZE_BLOCK_SIZE, settings.OCR_BINARIZE_OFFSET
+            ],
+            "deskew": settings.OCR_PREPROCESS_DESKEW and settings.OCR_DESKEW_MAX_ANGLE,
+            "crop": settings.OCR_PREPROCESS_CROP and settings.OCR_CROP_MARGIN,
+        },
+    }, sort_keys=True)
+
+
+async def extract_text_from_file(
+    file_path: str,
+    content_hash: Optional[str] = None,
+    progress: Optional[ProgressCallback] = None
+) -> str:
     """
     Uses EasyOCR (preferred) or Tesseract to extract text from an image/PDF.
-    Returns a single cleaned text block.
+    Returns a single text block, rebuilt line by line from the recognized tokens.
+    See extract_tokens_from_file.
     """
-    file_ext = Path(file_path).suffix.lower()
+    return tokens_to_text(await extract_tokens_from_file(file_path, content_hash, progress))
+
+
+async def extract_tokens_from_file(
+    file_path: str,
+    content_hash: Optional[str] = None,
+    progress: Optional[ProgressCallback] = None
+) -> List[OCRToken]:
+    """
+    Recognize an image/PDF and return its words or text boxes with page, box and
+    confidence (see ocr_layout.OCRToken).
+    The work runs in the OCR worker pool so the event loop stays free.
+    Results are cached by content; pass content_hash (SHA-256 hex of the file)
+    if it is already known to avoid re-reading the file.
+    progress, if given, is awaited as pages are done.
+    """
+    cache_key = None
+    if settings.OCR_CACHE_ENABLED:
+        content_hash = content_hash or await asyncio.to_thread(hash_file, file_path)
+        cache_key = ocr_cache.key(content_hash, ocr_fingerprint())
+        cached = await asyncio.to_thread(ocr_cache.get, cache_key)
+        if cached is not None:
+            return tokens_from_json(json.loads(cached))
     
-    # Handle PDFs
-    if file_ext == '.pdf':
-        return await _extract_from_pdf(file_path)
+    if Path(file_path).suffix.lower() == '.pdf':
+        tokens = [t for page in await extract_pdf_page_tokens(file_path, progress) for t in page]
+    else:
+        tokens = await ocr_pool.run(extract_tokens_sync, file_path)
+        if progress:
+            await progress(1, 1)
     
-    # Handle images
-    elif file_ext in ['.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff']:
-        return await _extract_from_image(file_path)
+    if cache_key:
+        await asyncio.to_thread(ocr_cache.put, cache_key, json.dumps(tokens_to_json(tokens)))
+    return tokens
+
+
+async def extract_text_from_regions(
+    file_path: str,
+    regions: Sequence[Dict],
+    content_hash: Optional[str] = None,
+    progress: Optional[ProgressCallback] = None
+) -> Dict[int, str]:
+    """
+    OCR only the answer boxes of a layout template and return {question_id: text}.
+    Regions are {"question_id", "page", "box": [x0, y0, x1, y1]} with the box in
+    fractions of the page size. Each page is rendered once and all of its boxes
+    are recognized in the same worker; pages run in parallel across workers.
+    A question with several regions gets their texts joined in template order;
+    regions on pages the file does not have read as empty.
+    Cached like extract_text_from_file, keyed by the template as well.
+    """
+    cache_key = None
+    if settings.OCR_CACHE_ENABLED:
+        content_hash = content_hash or await asyncio.to_thread(hash_file, file_path)
+        fingerprint = ocr_fingerprint() + json.dumps(list(regions), sort_keys=True)
+        cache_key = ocr_cache.key(content_hash, fingerprint)
+        cached = await asyncio.to_thread(ocr_cache.get, cache_key)
+        if cached is not None:
+            return {int(question_id): text for question_id, text in json.loads(cached).items()}
     
+    if Path(file_path).suffix.lower() == '.pdf':
+        page_count = await ocr_pool.run(_pdf_page_count, file_path)
     else:
-        raise ValueError(f"Unsupported file type: {file_ext}")
+        page_count = 1
+    boxes_by_page: Dict[int, List[tuple]] = {}
+    for region in regions:
+        if region["page"] < page_count:
+            boxes_by_page.setdefault(region["page"], []).append(tuple(region["box"]))
+    tasks = [(file_path, page, tuple(boxes)) for page, boxes in boxes_by_page.items()]
+    page_texts = await ocr_pool.map(_ocr_page_regions, tasks, _counting(progress, len(tasks))) if tasks else []
+    texts_by_page = {page: iter(texts) for page, texts in zip(boxes_by_page, page_texts)}
+    
+    answers: Dict[int, str] = {}
+    for region in regions:
+        text = next(texts_by_page[region["page"]]) if region["page"] < page_count else ""
+        previous = answers.get(region["question_id"])
+        answers[region["question_id"]] = f"{previous} {text}" if previous else text
+    
+    if cache_key:
+        await asyncio.to_thread(ocr_cache.put, cache_key, json.dumps(answers))
+    return answers
 
 
-async def _extract_from_pdf(file_path: str) -> str:
-    """Extract text from PDF file."""
-    all_text = []
+def extract_tokens_sync(file_path: str) -> List[OCRToken]:
+    """
+    Synchronous OCR of an image file; runs inside an OCR worker.
+    PDFs go through extract_pdf_page_tokens, one page per worker task.
+    """
+    file_ext = Path(file_path).suffix.lower()
+    if file_ext in ['.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff']:
+        return _ocr_image_tokens(file_path)
+    raise ValueError(f"Unsupported file type: {file_ext}")
+
+
+def _counting(progress: Optional[ProgressCallback], total: int, done: int = 0):
+    """Adapt a ProgressCallback to ocr_pool.map's per-result hook."""
+    if progress is None:
+        return None
+
+    async def on_result(index, result):
+        nonlocal done
+        done += 1
+        await progress(done, total)
+    return on_result
+
+
+async def extract_pdf_page_tokens(
+    file_path: str,
+    progress: Optional[ProgressCallback] = None
+) -> List[List[OCRToken]]:
+    """
+    Recognize each page of a PDF, in page order.
+    Pages with a usable text layer are read directly; only image pages are
+    rendered and OCR'd, in parallel across workers. Not cached.
+    progress, if given, is awaited with (pages done, page count).
+    """
+    page_tokens = await ocr_pool.run(_classify_pdf_pages, file_path)
+    
+    ocr_pages = [i for i, tokens in enumerate(page_tokens) if tokens is None]
+    metrics.increment("ocr_pdf_pages_text_layer", len(page_tokens) - len(ocr_pages))
+    metrics.increment("ocr_pdf_pages_ocr", len(ocr_pages))
+    if progress:
+        await progress(len(page_tokens) - len(ocr_pages), len(page_tokens))
+    if ocr_pages:
+        results = await ocr_pool.map(
+            _ocr_pdf_page,
+            [(file_path, i) for i in ocr_pages],
+            _counting(progress, len(page_tokens), len(page_tokens) - len(ocr_pages)),
+            window=settings.OCR_PAGE_WINDOW or None
+        )
+        for page_index, tokens in zip(ocr_pages, results):
+            page_tokens[page_index] = tokens
     
-    # Try PyMuPDF first (faster, better text extraction)
+    return page_tokens
+
+
+def _classify_pdf_pages(file_path: str) -> List[Optional[List[OCRToken]]]:
+    """
+    Decide per page whether the embedded text layer can be used.
+    Returns the page's words for digital pages and None for pages that need OCR:
+    pages with (almost) no text, or mostly covered by images such as a scanned
+    sheet with a typed header stamped on top.
+    Without PyMuPDF every page needs OCR.
+    """
     if PYMUPDF_AVAILABLE:
         try:
-            doc = fitz.open(file_path)
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                text = page.get_text()
-                if text:
-                    all_text.append(text)
-            doc.close()
-            return "\n".join(all_text)
+            page_tokens = []
+            with fitz.open(file_path) as doc:
+                for page in doc:
+                    # (x0, y0, x1, y1, word, block, line, word number) in points
+                    words = page.get_text("words")
+                    if (sum(len(w[4]) for w in words) >= settings.OCR_MIN_PAGE_TEXT_CHARS
+                            and _image_coverage(page) < settings.OCR_MAX_PAGE_IMAGE_COVERAGE):
+                        page_tokens.append([
+                            OCRToken(w[4], (w[0], w[1], w[2], w[3]), 1.0, page.number) for w in words
+                        ])
+                    else:
+                        page_tokens.append(None)
+            return page_tokens
         except Exception as e:
-            print(f"PyMuPDF extraction failed: {e}, trying pdf2image...")
-    
-    # Fallback: Convert PDF pages to images and OCR
+            print(f"PyMuPDF extraction failed: {e}, trying OCR...")
+    return [None] * _pdf_page_count(file_path)
+
+
+def _image_coverage(page) -> float:
+    """Fraction of the page area covered by embedded images."""
+    page_rect = page.rect
+    page_area = page_rect.width * page_rect.height
+    if page_area <= 0:
+        return 0.0
+    covered = 0.0
+    for info in page.get_image_info():
+        bbox = fitz.Rect(info["bbox"]) & page_rect
+        if not bbox.is_empty:
+            covered += bbox.width * bbox.height
+    return min(covered / page_area, 1.0)
+
+
+def _pdf_page_count(file_path: str) -> int:
+    if PYMUPDF_AVAILABLE:
+        try:
+            with fitz.open(file_path) as doc:
+                return doc.page_count
+        except Exception:
+            pass
     if PDF2IMAGE_AVAILABLE:
         try:
-            images = convert_from_path(file_path)
-            for img in images:
-                # Save temp image
-                with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
-                    img.save(tmp.name)
-                    text = await _extract_from_image(tmp.name)
-                    all_text.append(text)
-                    os.unlink(tmp.name)
-            return "\n".join(all_text)
+            return pdfinfo_from_path(file_path)["Pages"]
         except Exception as e:
             raise ValueError(f"PDF extraction failed: {e}")
-    
     raise ValueError("No PDF extraction library available. Install PyMuPDF or pdf2image.")
 
 
-async def _extract_from_image(file_path: str) -> str:
-    """Extract text from image file."""
+def iter_pdf_page_images(file_path: str, page_indexes: Iterable[int]) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Rasterize PDF pages one at a time into grayscale NumPy arrays (no temp files),
+    yielding (page_index, image) in the given order. Only the page being consumed
+    is held in memory, so peak usage does not grow with the document length.
+    """
+    page_indexes = list(page_indexes)
+    position = 0
+    if PYMUPDF_AVAILABLE:
+        try:
+            with fitz.open(file_path) as doc:
+                while position < len(page_indexes):
+                    pix = doc[page_indexes[position]].get_pixmap(dpi=settings.OCR_PDF_DPI, colorspace=fitz.csGRAY)
+                    image = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+                    del pix  # Free MuPDF's copy before the consumer runs
+                    position += 1
+                    yield page_indexes[position - 1], image
+            return
+        except Exception as e:
+            print(f"PyMuPDF rendering failed: {e}, trying pdf2image...")
+    if PDF2IMAGE_AVAILABLE:
+        for page_index in page_indexes[position:]:
+            try:
+                images = convert_from_path(
+                    file_path,
+                    dpi=settings.OCR_PDF_DPI,
+                    first_page=page_index + 1,
+                    last_page=page_index + 1,
+                    grayscale=True
+                )
+            except Exception as e:
+                raise ValueError(f"PDF extraction failed: {e}")
+            yield page_index, np.asarray(images[0])
+        return
+    raise ValueError("No PDF extraction library available. Install PyMuPDF or pdf2image.")
+
+
+def _render_pdf_page(file_path: str, page_index: int) -> np.ndarray:
+    """Rasterize a single PDF page into a grayscale NumPy array."""
+    for _, image in iter_pdf_page_images(file_path, [page_index]):
+        return image
+    raise ValueError(f"PDF page {page_index} could not be rendered")
+
+
+def _ocr_pdf_page(file_path: str, page_index: int) -> List[OCRToken]:
+    """Render and OCR a single page; runs inside an OCR worker."""
+    return _ocr_image_tokens(_render_pdf_page(file_path, page_index), dpi=settings.OCR_PDF_DPI, page=page_index)
+
+
+def _ocr_page_regions(file_path: str, page_index: int, boxes: Sequence[Sequence[float]]) -> List[str]:
+    """
+    Render or decode one page once, then crop each answer box out of it and OCR
+    it; returns the texts in box order. Runs inside an OCR worker.
+    """
+    if Path(file_path).suffix.lower() == '.pdf':
+        page, dpi = _render_pdf_page(file_path, page_index), settings.OCR_PDF_DPI
+    else:
+        img, dpi = load_image(file_path)
+        page = np.asarray(img)
+    height, width = page.shape[:2]
+    texts = []
+    for x0, y0, x1, y1 in boxes:
+        crop = page[
+            int(y0 * height):max(math.ceil(y1 * height), int(y0 * height) + 1),
+            int(x0 * width):max(math.ceil(x1 * width), int(x0 * width) + 1)
+        ]
+        texts.append(tokens_to_text(_ocr_image_tokens(crop, dpi)))
+    return texts
+
+
+def _ocr_image_tokens(
+    image: Union[str, np.ndarray],
+    dpi: Optional[float] = None,
+    page: int = 0
+) -> List[OCRToken]:
+    """
+    Recognize an image file path or an in-memory image array; tokens are
+    tagged with the given page index.
+    The image is preprocessed first (see ocr_preprocessing); dpi is the known
+    resolution of in-memory renders.
+    """
+    tokens = _recognize(preprocess_image(image, dpi))
+    return [t._replace(page=page) for t in tokens] if page else tokens
+
+
+def _recognize(image: np.ndarray) -> List[OCRToken]:
+    tesseract_tokens = None
+    if settings.OCR_TESSERACT_FIRST_PASS and TESSEROCR_AVAILABLE:
+        # Clean printed sheets come back confident from Tesseract at a fraction of EasyOCR's cost
+        try:
+            tesseract_tokens = _tesserocr_tokens(image)
+            confidence = 100 * sum(t.confidence for t in tesseract_tokens) / max(len(tesseract_tokens), 1)
+            if tesseract_tokens and confidence >= settings.OCR_TESSERACT_MIN_CONFIDENCE:
+                metrics.increment("ocr_tesseract_first_pass_hits")
+                return tesseract_tokens
+            metrics.increment("ocr_tesseract_first_pass_misses")
+        except RuntimeError as e:
+            print(f"Tesseract first pass failed: {e}")
+    
     # Try EasyOCR first (better accuracy)
     if EASYOCR_AVAILABLE:
         try:
-            reader = easyocr.Reader(['en'], gpu=False)  # Use CPU for compatibility
-            results = reader.readtext(file_path)
-            # Combine all detected text
-            text_lines = [result[1] for result in results]
-            return "\n".join(text_lines)
+            return _easyocr_tokens(image)
         except Exception as e:
             print(f"EasyOCR extraction failed: {e}, trying Tesseract...")
+
+    if tesseract_tokens is not None:
+        return tesseract_tokens
+
+    # Fallback to Tesseract, in-process when tesserocr is installed
+    if TESSEROCR_AVAILABLE:
+        try:
+            return _tesserocr_tokens(image)
+        except RuntimeError as e:
+            if not TESSERACT_AVAILABLE:
+                raise ValueError(f"Tesseract extraction failed: {e}")
+            print(f"tesserocr extraction failed: {e}, trying pytesseract...")
     
-    # Fallback to Tesseract
     if TESSERACT_AVAILABLE:
         try:
-            image = Image.open(file_path)
-            text = pytesseract.image_to_string(image)
-            return text
+            return _pytesseract_tokens(image)
         except Exception as e:
             raise ValueError(f"Tesseract extraction failed: {e}")
     
-    raise ValueError("No OCR library available. Install easyocr or pytesseract.")
+    raise ValueError("No OCR library available. Install easyocr, tesserocr or pytesseract.")
 
 
 def clean_ocr_text(text: str) -> str:
@@ -0,0 +1,126 @@
+"""
+Content-addressed cache of OCR results on local disk.
+
+Entries are keyed by the SHA-256 of the uploaded bytes plus a fingerprint of the
+OCR engines and settings, so a re-upload of the same photo skips OCR entirely
+while any engine or configuration change naturally misses.
+Eviction is least-recently-used by file mtime, bounded by total size.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+from app.core.config import settings
+from app.services import metrics
+
+
+def hash_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OCRCache:
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None  # Computed on first use
+
+    def key(self, content_hash: str, fingerprint: str) -> str:
+        return hashlib.sha256(f"{content_hash}:{fingerprint}".encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.txt"
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            text = path.read_text(encoding="utf-8")
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:
+            metrics.increment("ocr_cache_misses")
+            return None
+        metrics.increment("ocr_cache_hits")
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        """Store an entry. Best effort: a failed write (full disk, permissions) is logged, not raised."""
+        path = self._path(key)
+        data = text.encode("utf-8")
+        tmp_path = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                old_size = path.stat().st_size
+            except FileNotFoundError:
+                old_size = 0
+            # Write then rename so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"OCR cache write failed: {e}")
+            metrics.increment("ocr_cache_write_errors")
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+            return
+
+        with self._lock:
+            if self._size is None:
+                self._current_size()  # First scan already includes this entry
+            else:
+                self._size += len(data) - old_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def size(self) -> int:
+        with self._lock:
+            return self._current_size()
+
+    def _entries(self):
+        if not self.directory.exists():
+            return []
+        return list(self.directory.glob("*/*.txt"))
+
+    def _current_size(self) -> int:
+        if self._size is None:
+            self._size = sum(entry.stat().st_size for entry in self._entries())
+        return self._size
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the cache is under 90% of its budget."""
+        target = int(self.max_bytes * 0.9)
+        entries = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+        entries.sort()
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, entry in entries:
+            if size <= target:
+                break
+            try:
+                entry.unlink()
+                size -= entry_size
+                metrics.increment("ocr_cache_evictions")
+            except FileNotFoundError:
+                continue
+        self._size = size
+
+
+ocr_cache = OCRCache(settings.OCR_CACHE_DIR, settings.OCR_CACHE_MAX_BYTES)
+metrics.register_gauge("ocr_cache_bytes", ocr_cache.size)
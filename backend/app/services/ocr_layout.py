@@ -0,0 +1,82 @@
+"""
+Geometry of OCR output.
+
+The engines return recognized words or text boxes with their position on the
+page and a confidence. Keeping those, instead of a flat string, lets answer
+extraction work from where text sits on the sheet (see
+answer_extraction.extract_answers_from_tokens); plain text is rebuilt from the
+same tokens line by line.
+"""
+from statistics import median
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+
+class OCRToken(NamedTuple):
+    text: str
+    box: Tuple[float, float, float, float]  # x0, y0, x1, y1 in page pixels (points for PDF text layers)
+    confidence: float  # 0-1; text layers of digital PDFs are 1
+    page: int = 0
+
+    @property
+    def height(self) -> float:
+        return self.box[3] - self.box[1]
+
+    @property
+    def center_x(self) -> float:
+        return (self.box[0] + self.box[2]) / 2
+
+    @property
+    def center_y(self) -> float:
+        return (self.box[1] + self.box[3]) / 2
+
+
+def tokens_to_json(tokens: List[OCRToken]) -> list:
+    return [[t.text, list(t.box), t.confidence, t.page] for t in tokens]
+
+
+def tokens_from_json(data: list) -> List[OCRToken]:
+    return [OCRToken(text, tuple(box), confidence, page) for text, box, confidence, page in data]
+
+
+def typical_height(tokens: Iterable[OCRToken]) -> float:
+    heights = [t.height for t in tokens if t.height > 0]
+    return median(heights) if heights else 1.0
+
+
+def group_lines(tokens: Iterable[OCRToken]) -> List[List[OCRToken]]:
+    """
+    Group one page's tokens into text lines, top to bottom, each left to right.
+    A token joins a line when its vertical centre is within half a typical token
+    height of the line's centre, which tolerates slight skew and mixed sizes.
+    """
+    tokens = sorted(tokens, key=lambda t: t.center_y)
+    if not tokens:
+        return []
+    tolerance = typical_height(tokens) / 2
+
+    lines: List[List[OCRToken]] = []
+    centers: List[float] = []
+    for token in tokens:
+        if lines and abs(token.center_y - centers[-1]) <= tolerance:
+            lines[-1].append(token)
+            centers[-1] += (token.center_y - centers[-1]) / len(lines[-1])
+        else:
+            lines.append([token])
+            centers.append(token.center_y)
+    return [sorted(line, key=lambda t: t.box[0]) for line in lines]
+
+
+def group_pages(tokens: Iterable[OCRToken]) -> Dict[int, List[OCRToken]]:
+    pages: Dict[int, List[OCRToken]] = {}
+    for token in tokens:
+        pages.setdefault(token.page, []).append(token)
+    return dict(sorted(pages.items()))
+
+
+def tokens_to_text(tokens: Iterable[OCRToken]) -> str:
+    """Plain text: words of a line joined by spaces, lines and pages by newlines."""
+    return "\n".join(
+        " ".join(t.text for t in line)
+        for page_tokens in group_pages(tokens).values()
+        for line in group_lines(page_tokens)
+    )
@@ -0,0 +1,167 @@
+"""
+Dedicated process pool for OCR.
+
+EasyOCR, Tesseract and PyMuPDF are synchronous and CPU-bound, so running them in
+the request handler freezes the whole uvicorn worker. Each pool process loads its
+own OCR models once (see ocr.init_reader_pool) and requests await the result.
+The number of in-flight tasks is capped; beyond that callers get OCRBusyError,
+which the API turns into 503 + Retry-After instead of an unbounded backlog.
+A worker killed mid-task (OOM, a crash in a native OCR library) breaks the whole
+executor; it is then replaced, so only the tasks running at that moment fail.
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Awaitable, Callable, List, Optional, Sequence
+from app.core.config import settings
+from app.services import metrics
+
+
+class OCRBusyError(Exception):
+    """Raised when the OCR queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("OCR queue is full")
+        self.retry_after = retry_after
+
+
+def _init_worker() -> None:
+    # Imported here: the ocr module imports this one
+    from app.services.ocr import init_reader_pool, init_tesseract
+    init_reader_pool(size=1)
+    init_tesseract()
+
+
+def _ping() -> bool:
+    return True
+
+
+def _run_collecting_metrics(fn: Callable, *args):
+    """
+    Run fn in a worker and return its result along with the counters it
+    incremented, so worker-side metrics reach the API process's /metrics.
+    Workers run one task at a time, so the difference belongs to this call.
+    """
+    before = metrics.counters()
+    result = fn(*args)
+    deltas = {
+        name: value - before.get(name, 0.0)
+        for name, value in metrics.counters().items()
+        if value != before.get(name, 0.0)
+    }
+    return result, deltas
+
+
+class OCRWorkerPool:
+    def __init__(self, workers: int, max_queue: int, start_method: str):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.start_method = start_method
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight = 0
+
+    def depth(self) -> int:
+        return self._in_flight
+
+    async def start(self) -> None:
+        """Spawn workers and wait until each one has loaded its models."""
+        metrics.register_gauge("ocr_queue_depth", self.depth)
+        if self.workers <= 0:
+            return
+        self._executor = self._new_executor()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[
+            loop.run_in_executor(self._executor, _ping) for _ in range(self.workers)
+        ])
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(self.start_method),
+            initializer=_init_worker
+        )
+
+    def _replace_broken(self, executor: ProcessPoolExecutor) -> None:
+        # Tasks failing together on one broken executor replace it only once
+        if self._executor is not executor:
+            return
+        print("OCR worker died, restarting the OCR pool")
+        metrics.increment("ocr_pool_restarts")
+        executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._new_executor()
+
+    def stop(self) -> None:
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _admit(self) -> None:
+        if self._in_flight >= self.max_queue:
+            metrics.increment("ocr_rejected")
+            raise OCRBusyError(retry_after=settings.OCR_RETRY_AFTER_SECONDS)
+
+    async def _submit(self, fn: Callable, *args):
+        self._in_flight += 1
+        try:
+            if self._executor:
+                loop = asyncio.get_running_loop()
+                executor = self._executor
+                try:
+                    future = loop.run_in_executor(executor, _run_collecting_metrics, fn, *args)
+                except BrokenProcessPool:
+                    # Broke before this task was sent; safe to send it to the new pool
+                    self._replace_broken(executor)
+                    executor = self._executor
+                    future = loop.run_in_executor(executor, _run_collecting_metrics, fn, *args)
+                try:
+                    result, deltas = await future
+                except BrokenProcessPool:
+                    # This task may be what killed the worker, so it is not retried
+                    self._replace_broken(executor)
+                    raise
+                for name, value in deltas.items():
+                    metrics.increment(name, value)
+                return result
+            return await asyncio.to_thread(fn, *args)
+        finally:
+            self._in_flight -= 1
+
+    async def run(self, fn: Callable, *args):
+        """
+        Run fn(*args) in an OCR worker. Without a started pool (scripts, tests)
+        it runs in a thread so the event loop is still not blocked.
+        """
+        self._admit()
+        return await self._submit(fn, *args)
+
+    async def map(
+        self,
+        fn: Callable,
+        arg_tuples: Sequence[tuple],
+        on_result: Optional[Callable[[int, object], Awaitable[None]]] = None,
+        window: Optional[int] = None
+    ) -> List:
+        """
+        Run fn over many argument tuples in parallel and return results in input order.
+        The batch is admitted as one job, so a document is never rejected halfway;
+        at most window tasks (default: one per worker) run at a time for this batch.
+        on_result(index, result) is awaited as each task finishes, e.g. for progress.
+        """
+        self._admit()
+        limit = asyncio.Semaphore(window or max(self.workers, 1))
+
+        async def run_one(index: int, args: tuple):
+            async with limit:
+                result = await self._submit(fn, *args)
+            if on_result:
+                await on_result(index, result)
+            return result
+
+        return await asyncio.gather(*[run_one(i, args) for i, args in enumerate(arg_tuples)])
+
+ocr_pool = OCRWorkerPool(
+    workers=settings.OCR_WORKERS,
+    max_queue=settings.OCR_MAX_QUEUE,
+    start_method=settings.OCR_START_METHOD
+)
@@ -0,0 +1,228 @@
+"""
+Image preprocessing applied before OCR.
+
+Phone photos of worksheets arrive at 12 MP, in color and slightly rotated, and
+most of those pixels carry no text. The steps below shrink the image to what OCR
+needs: downscale to a target DPI, grayscale, adaptive binarization, deskew and a
+crop to the written area. Each step has its own setting and its time is added to
+the ocr_preprocess_<step>_seconds counter.
+"""
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Tuple, Union
+import numpy as np
+from PIL import Image, ImageOps
+from app.core.config import settings
+from app.services import metrics
+
+# Photos carry no real DPI; assume the sheet's long side (Letter/A4) fills the frame
+ASSUMED_PAGE_LONG_SIDE_INCHES = 11.0
+DESKEW_THUMBNAIL_WIDTH = 600
+DESKEW_ANGLE_STEP = 0.5
+
+
+@contextmanager
+def _timed(step: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.increment(f"ocr_preprocess_{step}_seconds", time.perf_counter() - started)
+
+
+def preprocess_image(
+    image: Union[str, Path, np.ndarray],
+    dpi: Optional[float] = None
+) -> np.ndarray:
+    """
+    Run the enabled preprocessing steps and return a uint8 array for the OCR engines.
+    dpi is the known resolution of in-memory renders (PDF pages); for files it is
+    read from the image metadata or estimated from the pixel size.
+    Raises ValueError if the image cannot be decoded.
+    """
+    with _timed("load"):
+        img, dpi = load_image(image, dpi)
+
+    if settings.OCR_PREPROCESS_DOWNSCALE:
+        with _timed("downscale"):
+            img = _downscale(img, dpi)
+
+    if settings.OCR_PREPROCESS_GRAYSCALE or settings.OCR_PREPROCESS_BINARIZE:
+        with _timed("grayscale"):
+            img = img.convert("L")
+
+    binarized = False
+    if settings.OCR_PREPROCESS_BINARIZE:
+        with _timed("binarize"):
+            img = Image.fromarray(_adaptive_threshold(
+                np.asarray(img), settings.OCR_BINARIZE_BLOCK_SIZE, settings.OCR_BINARIZE_OFFSET
+            ))
+            binarized = True
+
+    if settings.OCR_PREPROCESS_DESKEW:
+        with _timed("deskew"):
+            img = _deskew(img, binarized)
+
+    if settings.OCR_PREPROCESS_CROP:
+        with _timed("crop"):
+            img = _crop_to_content(img, binarized)
+
+    metrics.increment("ocr_preprocess_images")
+    return np.ascontiguousarray(np.asarray(img))
+
+
+def load_image(image: Union[str, Path, np.ndarray], dpi: Optional[float] = None) -> Tuple[Image.Image, float]:
+    """
+    Open an image upright (EXIF orientation applied) as L or RGB and return it
+    with its resolution, known, read from metadata or estimated.
+    With downscaling enabled, JPEGs are decoded at reduced scale.
+    """
+    if isinstance(image, np.ndarray):
+        img = Image.fromarray(image)
+    else:
+        try:
+            with Image.open(image) as f:
+                dpi = dpi or _metadata_dpi(f)
+                if settings.OCR_PREPROCESS_DOWNSCALE and f.format == "JPEG":
+                    # Let the JPEG decoder skip detail we would throw away anyway
+                    scale = _downscale_factor(f.size, dpi)
+                    if scale < 1:
+                        full_width = f.width
+                        mode = "L" if settings.OCR_PREPROCESS_GRAYSCALE else "RGB"
+                        f.draft(mode, (int(f.width * scale), int(f.height * scale)))
+                        if dpi:
+                            dpi *= f.width / full_width
+                img = ImageOps.exif_transpose(f)  # Phones store rotation in EXIF
+                img.load()
+        except (OSError, Image.DecompressionBombError) as e:
+            raise ValueError(f"Could not read image: {e}")
+
+    if img.mode not in ("L", "RGB"):
+        img = img.convert("RGB")
+    return img, dpi or max(img.size) / ASSUMED_PAGE_LONG_SIDE_INCHES
+
+
+def _metadata_dpi(img: Image.Image) -> Optional[float]:
+    dpi = img.info.get("dpi")
+    if not dpi:
+        return None
+    try:
+        value = float(dpi[0])
+    except (TypeError, ValueError, IndexError):
+        return None
+    # Cameras commonly write a placeholder 72 DPI; only trust plausible scanner values
+    return value if value >= 100 else None
+
+
+def _downscale_factor(size: Tuple[int, int], dpi: Optional[float]) -> float:
+    dpi = dpi or max(size) / ASSUMED_PAGE_LONG_SIDE_INCHES
+    return min(settings.OCR_PREPROCESS_TARGET_DPI / dpi, 1.0)
+
+
+def _downscale(img: Image.Image, dpi: float) -> Image.Image:
+    scale = min(settings.OCR_PREPROCESS_TARGET_DPI / dpi, 1.0)
+    if scale >= 0.95:
+        return img
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    return img.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+
+def _adaptive_threshold(gray: np.ndarray, block_size: int, offset: int) -> np.ndarray:
+    """
+    Local mean thresholding: a pixel is ink when it is darker than the mean of its
+    block_size x block_size neighbourhood by more than offset. Window sums come
+    from an integral image, so the cost does not depend on the block size.
+    """
+    half = block_size // 2
+    block_size = 2 * half + 1
+    height, width = gray.shape
+    padded = np.pad(gray, half, mode="edge").astype(np.int64)
+    integral = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1), dtype=np.int64)
+    np.cumsum(np.cumsum(padded, axis=0), axis=1, out=integral[1:, 1:])
+
+    window_sums = (
+        integral[block_size:block_size + height, block_size:block_size + width]
+        - integral[:height, block_size:block_size + width]
+        - integral[block_size:block_size + height, :width]
+        + integral[:height, :width]
+    )
+    threshold = window_sums / (block_size * block_size) - offset
+    return np.where(gray < threshold, 0, 255).astype(np.uint8)
+
+
+def _ink_mask(gray: np.ndarray, binarized: bool) -> np.ndarray:
+    if binarized:
+        return gray < 128
+    return gray < _otsu_threshold(gray)
+
+
+def _otsu_threshold(gray: np.ndarray) -> int:
+    """Global threshold that best separates ink from paper."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256)
+    weight_bg = np.cumsum(hist)
+    weight_fg = weight_bg[-1] - weight_bg
+    cum_mean = np.cumsum(hist * levels)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_bg = cum_mean / weight_bg
+        mean_fg = (cum_mean[-1] - cum_mean) / weight_fg
+        between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.nanargmax(between)) + 1
+
+
+def _deskew(img: Image.Image, binarized: bool) -> Image.Image:
+    """
+    Estimate rotation with a projection profile: text lines produce the sharpest
+    row-sum histogram when they are horizontal. Angles are searched on a small
+    thumbnail; only the final rotation touches the full image.
+    """
+    gray = img if img.mode == "L" else img.convert("L")
+    scale = min(DESKEW_THUMBNAIL_WIDTH / gray.width, 1.0)
+    thumb = gray.resize((max(1, round(gray.width * scale)), max(1, round(gray.height * scale))))
+    ink = Image.fromarray((_ink_mask(np.asarray(thumb), binarized) * 255).astype(np.uint8))
+
+    max_angle = settings.OCR_DESKEW_MAX_ANGLE
+    best_angle, best_score = 0.0, -1.0
+    angles = np.arange(-max_angle, max_angle + DESKEW_ANGLE_STEP / 2, DESKEW_ANGLE_STEP)
+    for angle in sorted(angles, key=abs):  # Ties (e.g. a blank page) keep the image as is
+        rows = np.asarray(ink.rotate(angle, resample=Image.Resampling.NEAREST)).sum(axis=1, dtype=np.float64)
+        score = float(np.sum(np.diff(rows) ** 2))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+
+    if abs(best_angle) < DESKEW_ANGLE_STEP / 2:
+        return img
+    fill = 255 if img.mode == "L" else (255, 255, 255)
+    return img.rotate(best_angle, resample=Image.Resampling.BICUBIC, expand=True, fillcolor=fill)
+
+
+def _crop_to_content(img: Image.Image, binarized: bool) -> Image.Image:
+    """Crop to the bounding box of the ink plus a margin; blank images are left alone."""
+    gray = img if img.mode == "L" else img.convert("L")
+    ink = _ink_mask(np.asarray(gray), binarized)
+    # Mostly-dark rows/columns (and their anti-aliased edges) are the desk or
+    # scanner lid around the sheet, not writing
+    ink[:, _widen(ink.mean(axis=0) > 0.5)] = False
+    ink[_widen(ink.mean(axis=1) > 0.5), :] = False
+    # Ignore rows/columns with a single stray pixel (sensor noise, dust)
+    rows = np.flatnonzero(ink.sum(axis=1) > 1)
+    cols = np.flatnonzero(ink.sum(axis=0) > 1)
+    if rows.size == 0 or cols.size == 0:
+        return img
+
+    margin = settings.OCR_CROP_MARGIN
+    box = (
+        max(int(cols[0]) - margin, 0),
+        max(int(rows[0]) - margin, 0),
+        min(int(cols[-1]) + margin + 1, img.width),
+        min(int(rows[-1]) + margin + 1, img.height),
+    )
+    if box == (0, 0, img.width, img.height):
+        return img
+    return img.crop(box)
+
+
+def _widen(lines: np.ndarray, by: int = 2) -> np.ndarray:
+    """Extend a boolean row/column selection by `by` entries on each side."""
+    return np.convolve(lines, np.ones(2 * by + 1), mode="same") > 0
@@ -0,0 +1,169 @@
+"""
+Submission persistence helpers shared by typed, OCR and bulk submissions.
+Relies on the (assignment_id, student_id) unique constraint instead of
+check-then-insert queries.
+"""
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import insert, delete
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql, sqlite
+from app.grading import grade_answers
+from app.models import Submission, SubmissionStatus, Answer, Question
+from app.schemas import SubmissionResponse, AnswerResult
+
+
+def _dialect_insert(db: Session):
+    """Return the dialect-specific insert() that supports ON CONFLICT."""
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert
+    return postgresql.insert
+
+
+def insert_submissions(db: Session, assignment_id: int, rows: List[Dict]) -> Dict[int, int]:
+    """
+    Insert one submission per row with INSERT ... ON CONFLICT DO NOTHING.
+
+    Each row needs a "student_id" and may carry an "idempotency_key", and for
+    queued grading a "status" and "pending_answers".
+    Returns {student_id: submission_id} for the rows that were actually inserted;
+    students who already submitted are simply missing from the result. A FAILED
+    submission (its grading crashed) holds no answers and is replaced.
+    Does not commit, so a concurrent duplicate blocks until this transaction ends.
+    """
+    if not rows:
+        return {}
+
+    db.execute(
+        delete(Submission)
+        .where(
+            Submission.assignment_id == assignment_id,
+            Submission.student_id.in_([row["student_id"] for row in rows]),
+            Submission.status == SubmissionStatus.FAILED
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    stmt = (
+        _dialect_insert(db)(Submission)
+        .values([
+            {
+                "assignment_id": assignment_id,
+                "student_id": row["student_id"],
+                "idempotency_key": row.get("idempotency_key"),
+                "status": row.get("status", SubmissionStatus.GRADED),
+                "pending_answers": row.get("pending_answers"),
+            }
+            for row in rows
+        ])
+        .on_conflict_do_nothing(index_elements=["assignment_id", "student_id"])
+        .returning(Submission.id, Submission.student_id)
+    )
+    return {student_id: submission_id for submission_id, student_id in db.execute(stmt)}
+
+
+def bulk_grade_and_store(
+    db: Session,
+    assignment_id: int,
+    questions: List[Question],
+    answers_by_student: Dict[int, List[Dict]],
+    idempotency_keys: Optional[Dict[int, str]] = None
+) -> Dict[int, Tuple[int, float]]:
+    """
+    Create submissions for many students at once.
+
+    Inserts all submissions in one statement (students who already submitted are
+    skipped), grades every answer in one deduplicated batch and writes all answers
+    with a single executemany. Does not commit.
+    Returns {student_id: (submission_id, total_score)} for the inserted students.
+    """
+    idempotency_keys = idempotency_keys or {}
+    inserted = insert_submissions(db, assignment_id, [
+        {"student_id": student_id, "idempotency_key": idempotency_keys.get(student_id)}
+        for student_id in answers_by_student
+    ])
+    question_dict = {q.id: q for q in questions}
+
+    items = []
+    rows = []
+    for student_id, submission_id in inserted.items():
+        for answer_data in answers_by_student[student_id]:
+            question = question_dict[answer_data["question_id"]]
+            items.append((question.question_type, question.correct_answer, answer_data["student_answer"]))
+            rows.append({
+                "submission_id": submission_id,
+                "question_id": answer_data["question_id"],
+                "student_answer": answer_data["student_answer"],
+            })
+
+    totals: Dict[int, float] = defaultdict(float)
+    for row, (is_correct, score) in zip(rows, grade_answers(items)):
+        row["ai_score"] = score
+        row["ai_is_correct"] = is_correct
+        totals[row["submission_id"]] += score
+
+    if rows:
+        db.execute(insert(Answer), rows)
+
+    num_questions = len(questions)
+    return {
+        student_id: (submission_id, totals[submission_id] / num_questions if num_questions > 0 else 0.0)
+        for student_id, submission_id in inserted.items()
+    }
+
+
+def build_submission_response(
+    submission_id: int,
+    answers: List[Answer],
+    question_dict: Dict[int, Question]
+) -> SubmissionResponse:
+    """Build the graded result from stored answers."""
+    answer_results = []
+    total_score = 0.0
+    for answer in answers:
+        question = question_dict[answer.question_id]
+        answer_results.append(AnswerResult(
+            answer_id=answer.id,
+            question_id=answer.question_id,
+            student_answer=answer.student_answer,
+            correct_answer=question.correct_answer,
+            ai_is_correct=answer.ai_is_correct or False,
+            ai_score=answer.ai_score or 0.0,
+            feedback=answer.ai_feedback
+        ))
+        total_score += answer.ai_score or 0.0
+
+    num_questions = len(question_dict)
+    avg_score = total_score / num_questions if num_questions > 0 else 0.0
+
+    return SubmissionResponse(
+        submission_id=submission_id,
+        total_score=avg_score,
+        answers=answer_results
+    )
+
+
+def find_replayable_submission(
+    db: Session,
+    assignment_id: int,
+    student_id: int,
+    idempotency_key: Optional[str]
+) -> Optional[Submission]:
+    """
+    Return the stored submission if it was created with the same Idempotency-Key.
+    Returns None when there is no submission or the key does not match.
+    """
+    existing = db.query(Submission).filter(
+        Submission.assignment_id == assignment_id,
+        Submission.student_id == student_id
+    ).first()
+    if existing and idempotency_key and existing.idempotency_key == idempotency_key:
+        return existing
+    return None
+
+
+def load_submission_response(db: Session, submission: Submission) -> SubmissionResponse:
+    """Rebuild the response for an already-graded submission without regrading."""
+    questions = db.query(Question).filter(Question.assignment_id == submission.assignment_id).all()
+    answers = db.query(Answer).filter(Answer.submission_id == submission.id).order_by(Answer.id).all()
+    return build_submission_response(submission.id, answers, {q.id: q for q in questions})
@@ -0,0 +1,312 @@
+"""
+Durable queue for OCR uploads.
+
+Uploads sent with "Prefer: respond-async" are written to UPLOAD_DIR and recorded
+as an upload_jobs row before the request returns, so a restart mid-OCR loses
+nothing. Background workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED
+(a plain SELECT plus a guarded UPDATE on SQLite) and hold a lease while working,
+renewed on a heartbeat; a job whose worker died is claimed again once the lease
+expires. Every write a worker makes is guarded on the attempt number it claimed,
+so a worker that lost its lease cannot overwrite or grade the job a second time.
+Failures are retried with backoff until UPLOAD_JOB_MAX_ATTEMPTS, then the job is
+dead-lettered.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import and_, or_
+from app.core.config import settings
+from app.database import SessionLocal
+from app.models import UploadJob, UploadJobStatus, Assignment, Question
+from app.services import metrics
+from app.services.answer_extraction import extract_answers_from_file
+from app.services.ocr_pool import OCRBusyError
+from app.services.submissions import bulk_grade_and_store, find_replayable_submission
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class UploadQueue:
+    def __init__(self, workers: int, poll_seconds: float):
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        """Start workers; jobs queued or interrupted by a previous process are picked up."""
+        if self.workers <= 0:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self) -> None:
+        """Wake idle workers after a job was committed."""
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                claim = await asyncio.to_thread(_claim_job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Claiming upload job failed: {e}")
+                claim = None
+            if claim is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            await self._process(*claim)
+
+    async def _process(self, job_id: int, attempt: int) -> None:
+        started = time.perf_counter()
+        heartbeat = asyncio.create_task(_keep_lease(job_id, attempt))
+        try:
+            job, questions, layout_template = await asyncio.to_thread(_load_job, job_id)
+
+            async def report(done: int, total: int) -> None:
+                await asyncio.to_thread(_set_progress, job_id, attempt, done, total)
+
+            answers_data, ocr_text = await extract_answers_from_file(
+                job["file_path"], job["content_hash"], questions, layout_template, report
+            )
+            await asyncio.to_thread(_set_extracted, job_id, attempt, answers_data, ocr_text)
+            await asyncio.to_thread(_store_results, job_id, attempt, answers_data, ocr_text)
+        except asyncio.CancelledError:
+            raise
+        except OCRBusyError as e:
+            # Not the job's fault: put it back without using up an attempt
+            await asyncio.to_thread(_release, job_id, attempt, e.retry_after)
+        except ValueError as e:
+            # Unreadable or unsupported file; retrying will not help
+            await asyncio.to_thread(_fail, job_id, attempt, str(e), False)
+        except Exception as e:
+            print(f"Upload job {job_id} failed: {e}")
+            await asyncio.to_thread(_fail, job_id, attempt, str(e), True)
+        finally:
+            heartbeat.cancel()
+            metrics.increment("upload_jobs_seconds_total", time.perf_counter() - started)
+
+
+async def _keep_lease(job_id: int, attempt: int) -> None:
+    """Extend the job's lease while it is being processed."""
+    while True:
+        await asyncio.sleep(settings.UPLOAD_JOB_LEASE_SECONDS / 3)
+        try:
+            renewed = await asyncio.to_thread(_renew_lease, job_id, attempt)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Renewing lease of upload job {job_id} failed: {e}")
+            continue
+        if not renewed:
+            return  # Finished, or reclaimed by another worker
+
+
+def _held(db, job_id: int, attempt: int):
+    """Query for the job while this worker still holds it."""
+    return db.query(UploadJob).filter(
+        UploadJob.id == job_id,
+        UploadJob.status == UploadJobStatus.PROCESSING,
+        UploadJob.attempts == attempt
+    )
+
+
+def _claim_job() -> Optional[Tuple[int, int]]:
+    """Lease the oldest runnable job to this worker and return (id, attempt), or None."""
+    db = SessionLocal()
+    try:
+        now = _now()
+        job = db.query(UploadJob).filter(or_(
+            and_(UploadJob.status == UploadJobStatus.QUEUED, UploadJob.available_at <= now),
+            # The worker holding it died or was restarted
+            and_(UploadJob.status == UploadJobStatus.PROCESSING, UploadJob.locked_until < now)
+        )).order_by(UploadJob.id).limit(1).with_for_update(skip_locked=True).first()
+        if job is None:
+            return None
+
+        if job.status == UploadJobStatus.PROCESSING and job.attempts >= settings.UPLOAD_JOB_MAX_ATTEMPTS:
+            job.status = UploadJobStatus.DEAD
+            job.last_error = job.last_error or "Worker stopped while processing"
+            job.locked_until = None
+            db.commit()
+            metrics.increment("upload_jobs_dead")
+            return None
+
+        job_id, attempt = job.id, job.attempts + 1
+        # Guarded on the state we read, so two claimers without row locks (SQLite) cannot both win
+        claimed = db.query(UploadJob).filter(
+            UploadJob.id == job.id,
+            UploadJob.status == job.status,
+            UploadJob.attempts == job.attempts
+        ).update({
+            UploadJob.status: UploadJobStatus.PROCESSING,
+            UploadJob.attempts: attempt,
+            UploadJob.locked_until: now + timedelta(seconds=settings.UPLOAD_JOB_LEASE_SECONDS),
+            UploadJob.stage: "ocr",
+            UploadJob.progress: None,
+        }, synchronize_session=False)
+        db.commit()
+        return (job_id, attempt) if claimed else None
+    finally:
+        db.close()
+
+
+def _load_job(job_id: int):
+    db = SessionLocal()
+    try:
+        job = db.query(UploadJob).filter(UploadJob.id == job_id).one()
+        assignment = db.query(Assignment).filter(Assignment.id == job.assignment_id).one()
+        questions = db.query(Question).filter(Question.assignment_id == job.assignment_id).order_by(Question.id).all()
+        return (
+            {"file_path": job.file_path, "content_hash": job.content_hash},
+            questions,
+            assignment.layout_template
+        )
+    finally:
+        db.close()
+
+
+def _renew_lease(job_id: int, attempt: int) -> bool:
+    db = SessionLocal()
+    try:
+        renewed = _held(db, job_id, attempt).update(
+            {UploadJob.locked_until: _now() + timedelta(seconds=settings.UPLOAD_JOB_LEASE_SECONDS)},
+            synchronize_session=False
+        )
+        db.commit()
+        return bool(renewed)
+    finally:
+        db.close()
+
+
+def _set_progress(job_id: int, attempt: int, done: int, total: int) -> None:
+    db = SessionLocal()
+    try:
+        _held(db, job_id, attempt).update(
+            {
+                UploadJob.progress: {"done": done, "total": total},
+                UploadJob.locked_until: _now() + timedelta(seconds=settings.UPLOAD_JOB_LEASE_SECONDS),
+            },
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _set_extracted(job_id: int, attempt: int, answers_data: List[Dict], ocr_text: str) -> None:
+    """Publish the OCR text and extracted answers before grading starts."""
+    db = SessionLocal()
+    try:
+        _held(db, job_id, attempt).update({
+            UploadJob.stage: "extracted",
+            UploadJob.ocr_text: ocr_text,
+            UploadJob.extracted_answers: answers_data,
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _store_results(job_id: int, attempt: int, answers_data: List[Dict], ocr_text: str) -> None:
+    db = SessionLocal()
+    try:
+        # Guarded write first: it locks the row (the database, on SQLite) until the
+        # commit, so a reclaim cannot slip in between this check and the grading
+        if not _held(db, job_id, attempt).update({UploadJob.locked_until: None}, synchronize_session=False):
+            db.rollback()
+            return
+        job = db.query(UploadJob).filter(UploadJob.id == job_id).one()
+        questions = db.query(Question).filter(Question.assignment_id == job.assignment_id).all()
+        stored = bulk_grade_and_store(
+            db,
+            job.assignment_id,
+            questions,
+            {job.student_id: answers_data},
+            {job.student_id: job.idempotency_key} if job.idempotency_key else None
+        )
+        job.ocr_text = ocr_text
+        job.locked_until = None
+        if job.student_id in stored:
+            job.submission_id = stored[job.student_id][0]
+            job.status = UploadJobStatus.DONE
+            job.stage = "graded"
+        else:
+            existing = find_replayable_submission(db, job.assignment_id, job.student_id, job.idempotency_key)
+            if existing:
+                job.submission_id = existing.id
+                job.status = UploadJobStatus.DONE
+                job.stage = "graded"
+            else:
+                job.status = UploadJobStatus.DEAD
+                job.last_error = "Already submitted"
+        db.commit()
+        metrics.increment("upload_jobs_completed" if job.status == UploadJobStatus.DONE else "upload_jobs_dead")
+        if job.status == UploadJobStatus.DONE and os.path.exists(job.file_path):
+            os.unlink(job.file_path)
+    finally:
+        db.close()
+
+
+def _release(job_id: int, attempt: int, delay_seconds: float) -> None:
+    db = SessionLocal()
+    try:
+        _held(db, job_id, attempt).update({
+            UploadJob.status: UploadJobStatus.QUEUED,
+            UploadJob.attempts: UploadJob.attempts - 1,
+            UploadJob.available_at: _now() + timedelta(seconds=delay_seconds),
+            UploadJob.locked_until: None,
+            UploadJob.stage: "received",
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _fail(job_id: int, attempt: int, error: str, retryable: bool) -> None:
+    """Schedule a retry with exponential backoff, or dead-letter the job."""
+    db = SessionLocal()
+    try:
+        job = _held(db, job_id, attempt).with_for_update().first()
+        if job is None:
+            return  # Reclaimed by another worker meanwhile
+        job.last_error = error
+        job.locked_until = None
+        if retryable and job.attempts < settings.UPLOAD_JOB_MAX_ATTEMPTS:
+            job.status = UploadJobStatus.QUEUED
+            job.stage = "received"
+            delay = settings.UPLOAD_JOB_RETRY_SECONDS * 2 ** (job.attempts - 1)
+            job.available_at = _now() + timedelta(seconds=delay)
+            metrics.increment("upload_jobs_retried")
+        else:
+            job.status = UploadJobStatus.DEAD
+            metrics.increment("upload_jobs_dead")
+        db.commit()
+    finally:
+        db.close()
+
+
+upload_queue = UploadQueue(
+    workers=settings.UPLOAD_WORKERS,
+    poll_seconds=settings.UPLOAD_JOB_POLL_SECONDS
+)
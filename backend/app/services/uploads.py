@@ -0,0 +1,49 @@
+"""
+Streaming storage of uploaded files.
+
+Uploads are copied to disk chunk by chunk while being hashed, so memory per
+request stays at one chunk no matter how large the file is.
+"""
+import hashlib
+import os
+import tempfile
+from typing import Optional, Tuple
+from fastapi import UploadFile
+from app.core.config import settings
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES."""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Upload exceeds {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+async def save_upload(
+    upload: UploadFile,
+    suffix: str = "",
+    directory: Optional[str] = None,
+    max_bytes: Optional[int] = None
+) -> Tuple[str, str]:
+    """
+    Stream an upload into a new file and return (path, sha256 hex digest).
+    The caller owns the file. Raises UploadTooLarge (after removing the
+    partial file) once more than max_bytes have been read.
+    """
+    max_bytes = max_bytes if max_bytes is not None else settings.MAX_UPLOAD_BYTES
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await upload.read(settings.UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, digest.hexdigest()
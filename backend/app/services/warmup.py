@@ -0,0 +1,32 @@
+"""
+Loading shared, read-mostly state ahead of forking.
+
+Run in the gunicorn master with preload_app (see gunicorn.conf.py) so every
+worker inherits the OCR models and SymPy's parser and caches copy-on-write
+instead of loading its own copy.
+"""
+from app.core.config import settings
+from app.grading import grade_answers
+from app.models import QuestionType
+from app.services.ocr import init_reader_pool, init_tesseract
+
+# Exercises SymPy's parser, simplification and equation solving
+GRADING_SAMPLES = [
+    (QuestionType.NUMERIC, "4", "4.0"),
+    (QuestionType.ALGEBRA, "x=2", "2=x"),
+    (QuestionType.ALGEBRA, "2*x + 3", "3 + x*2"),
+    (QuestionType.ALGEBRA, "(x+1)**2", "x**2 + 2*x + 1"),
+    (QuestionType.SHORT_ANSWER, "photosynthesis", "Photosynthesis"),
+    (QuestionType.MCQ, "B", "b"),
+]
+
+
+def warm_shared_state() -> None:
+    """Load OCR models and warm grading in this process before workers are forked."""
+    # OCR processes only inherit the readers when forked; spawned ones load their own
+    if settings.OCR_WORKERS == 0 or settings.OCR_START_METHOD == "fork":
+        # Weights only: a warm-up inference would start torch's thread pool, which
+        # does not survive fork; each worker pays for its first inference itself
+        init_reader_pool(warmup=False)
+        init_tesseract()
+    grade_answers(GRADING_SAMPLES)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Answer extraction benchmark: the single-pass marker scan against the previous
+three-regex implementation, on a realistic answer sheet and on adversarial OCR
+text of doubling length.
+
+A linear extractor takes about twice as long when the input doubles; the
+previous patterns backtrack over runs of digits and markers and grow
+quadratically.
+
+Run: python benchmarks/answer_extraction_benchmark.py [--max-chars 16000]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.models import Question  # noqa: E402
+from app.services.answer_extraction import extract_student_answers  # noqa: E402
+
+
+def legacy_extract_student_answers(raw_text: str, assignment_questions: List[Question]) -> List[Dict[str, str]]:
+    """The previous implementation, kept for comparison."""
+    question_map = {i + 1: q for i, q in enumerate(assignment_questions)}
+    pattern1 = re.compile(r'(\d+)[\.\)]\s*(.+?)(?=\d+[\.\)]|$)', re.DOTALL | re.MULTILINE)
+    pattern2 = re.compile(r'q\s*(\d+)\s*[:\-]?\s*(.+?)(?=q\s*\d+|$)', re.DOTALL | re.MULTILINE | re.IGNORECASE)
+    pattern3 = re.compile(r'question\s*(\d+)\s*[:\-]?\s*(.+?)(?=question\s*\d+|$)', re.DOTALL | re.MULTILINE | re.IGNORECASE)
+    found_answers = {}
+    for match in pattern1.finditer(raw_text):
+        q_num = int(match.group(1))
+        answer_text = match.group(2).strip()
+        if q_num in question_map and answer_text:
+            found_answers[q_num] = answer_text
+    for pattern in (pattern2, pattern3):
+        if len(found_answers) < len(assignment_questions):
+            for match in pattern.finditer(raw_text):
+                q_num = int(match.group(1))
+                answer_text = match.group(2).strip()
+                if q_num in question_map and q_num not in found_answers and answer_text:
+                    found_answers[q_num] = answer_text
+    answers = []
+    for i, question in enumerate(assignment_questions):
+        student_answer = re.sub(r'\s+', ' ', found_answers.get(i + 1, "").strip()).strip()
+        answers.append({"question_id": question.id, "student_answer": student_answer})
+    return answers
+
+
+EXTRACTORS: Dict[str, Callable] = {
+    "single-pass": extract_student_answers,
+    "legacy": legacy_extract_student_answers,
+}
+
+# Each builds OCR-like text of roughly n characters
+ADVERSARIAL: Dict[str, Callable[[int], str]] = {
+    "digit run": lambda n: "7" * n,
+    "marker soup": lambda n: "1)" * (n // 2),
+    "no line breaks": lambda n: "1. " + "x " * (n // 2),
+    "q noise": lambda n: "q 1 " + "q " * (n // 2),
+}
+
+
+# Hand-written sheets both extractors must agree on: trailing "3." or "5)" are answers
+EDGE_CASES = ["Q1: 3.\nQ2: 4", "1) 5)\n2) 6", "Name: Ada\n1) 3.5\nQ2: x=2"]
+
+
+def _sheet(questions: int) -> str:
+    lines = ["Name: Ada Park", "Algebra practice", ""]
+    lines += [f"{n}. x={n * 3 - 7}" for n in range(1, questions + 1)]
+    return "\n".join(lines)
+
+
+def _time(fn: Callable, text: str, questions: List[Question], budget: float = 0.5) -> float:
+    """Mean seconds per call, repeating until the budget is used (at least once)."""
+    calls, started = 0, time.perf_counter()
+    while True:
+        fn(text, questions)
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= budget:
+            return elapsed / calls
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--max-chars", type=int, default=16000, help="largest adversarial input")
+    args = parser.parse_args()
+    questions = [Question(id=n) for n in range(1, args.questions + 1)]
+
+    sheet = _sheet(args.questions)
+    for text, qs in [(sheet, questions)] + [(text, questions[:2]) for text in EDGE_CASES]:
+        assert extract_student_answers(text, qs) == legacy_extract_student_answers(text, qs), text
+    print(f"Answer sheet ({args.questions} questions, {len(sheet)} chars)")
+    for name, fn in EXTRACTORS.items():
+        print(f"  {name:<12} {_time(fn, sheet, questions) * 1e6:>10.1f} us/sheet")
+
+    sizes = []
+    size = 1000
+    while size <= args.max_chars:
+        sizes.append(size)
+        size *= 2
+
+    for case, build in ADVERSARIAL.items():
+        print(f"\nAdversarial: {case}")
+        print(f"  {'chars':>8} " + " ".join(f"{name:>14}" for name in EXTRACTORS))
+        for size in sizes:
+            text = build(size)
+            timings = [_time(fn, text, questions, budget=0.2) for fn in EXTRACTORS.values()]
+            print(f"  {len(text):>8} " + " ".join(f"{t * 1e3:>11.2f} ms" for t in timings))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
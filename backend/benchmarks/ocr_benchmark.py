@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+OCR engine benchmark on synthetic worksheets.
+
+Renders answer sheets with Pillow (varying font, size, resolution, skew and
+noise) whose answers are known, then runs every available engine under each
+preprocessing profile and reports throughput, CPU time, peak memory and how
+many answers extract_answers_from_tokens recovers exactly. The PDF text-layer path
+is measured on the same sheets saved as digital PDFs.
+
+Each engine/profile combination runs in a fresh process, so peak RSS includes
+that engine's models and nothing else. Model loading and the first inference
+are excluded from the timings. Set OCR_TORCH_THREADS=1 to compare EasyOCR's
+per-core throughput.
+
+Run: python benchmarks/ocr_benchmark.py [--pages 20] [--engines easyocr,tesserocr]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+ENGINES = ("pdf-text", "tesserocr", "pytesseract", "easyocr")
+
+# Settings overrides applied before OCR; "configured" keeps the current settings
+PROFILES: Dict[str, Dict[str, object]] = {
+    "configured": {},
+    "none": {
+        "OCR_PREPROCESS_DOWNSCALE": False,
+        "OCR_PREPROCESS_GRAYSCALE": False,
+        "OCR_PREPROCESS_BINARIZE": False,
+        "OCR_PREPROCESS_DESKEW": False,
+        "OCR_PREPROCESS_CROP": False,
+    },
+    # Optional steps, off by default, one at a time and together
+    "+binarize": {"OCR_PREPROCESS_BINARIZE": True},
+    "+deskew": {"OCR_PREPROCESS_DESKEW": True},
+    "+crop": {"OCR_PREPROCESS_CROP": True},
+    "all": {
+        "OCR_PREPROCESS_DOWNSCALE": True,
+        "OCR_PREPROCESS_GRAYSCALE": True,
+        "OCR_PREPROCESS_BINARIZE": True,
+        "OCR_PREPROCESS_DESKEW": True,
+        "OCR_PREPROCESS_CROP": True,
+    },
+}
+
+FONTS = ("DejaVuSans.ttf", "DejaVuSerif.ttf", "DejaVuSansMono.ttf",
+         "LiberationSans-Regular.ttf", "Arial.ttf", "Times New Roman.ttf", "default")
+FONT_SIZES_PT = (12, 14, 16)
+RESOLUTIONS = (150, 200, 300)
+SKEW_DEGREES = (0, 0, -1.5, 2, -4, 5)
+NOISE_SIGMAS = (0, 0, 10, 25)
+MARKER_STYLES = ("{n}. ", "{n}) ", "Q{n} ", "Question {n}: ")
+NAMES = ("Ada Park", "Ben Ortiz", "Chloe Wu", "Dev Patel", "Eva Novak")
+QUESTIONS_PER_SHEET = 10
+
+
+def _load_font(name: str, size_px: int) -> ImageFont.FreeTypeFont:
+    if name == "default":
+        return ImageFont.load_default(size=size_px)
+    return ImageFont.truetype(name, size_px)
+
+
+def available_fonts() -> List[str]:
+    fonts = []
+    for name in FONTS:
+        try:
+            _load_font(name, 12)
+            fonts.append(name)
+        except (OSError, TypeError):  # Not installed / Pillow without FreeType sizes
+            continue
+    return fonts
+
+
+def _random_answer(rng: random.Random) -> str:
+    kind = rng.randrange(3)
+    if kind == 0:
+        return str(rng.randint(0, 999))
+    if kind == 1:
+        return f"x={rng.randint(-20, 20)}"
+    return f"{rng.randint(2, 9)}x+{rng.randint(1, 20)}"
+
+
+def render_worksheet(rng: random.Random, fonts: List[str]) -> Tuple[Image.Image, List[str], Dict]:
+    """A Letter-size answer sheet: a name line, then one numbered answer per line."""
+    dpi = rng.choice(RESOLUTIONS)
+    size_pt = rng.choice(FONT_SIZES_PT)
+    variation = {
+        "font": rng.choice(fonts),
+        "size_pt": size_pt,
+        "dpi": dpi,
+        "skew": rng.choice(SKEW_DEGREES),
+        "noise": rng.choice(NOISE_SIGMAS),
+        "marker": rng.choice(MARKER_STYLES),
+        "name": rng.choice(NAMES),
+    }
+    answers = [_random_answer(rng) for _ in range(QUESTIONS_PER_SHEET)]
+
+    font = _load_font(variation["font"], round(size_pt * dpi / 72))
+    img = Image.new("L", (round(8.5 * dpi), round(11 * dpi)), 255)
+    draw = ImageDraw.Draw(img)
+    line_height = round(size_pt * dpi / 72 * 2)
+    x, y = dpi, dpi  # One-inch margins
+    for line in _sheet_lines(variation, answers):
+        draw.text((x, y), line, font=font, fill=20)
+        y += line_height
+
+    if variation["skew"]:
+        img = img.rotate(variation["skew"], resample=Image.Resampling.BICUBIC, fillcolor=255)
+    if variation["noise"]:
+        noise_rng = np.random.default_rng(rng.getrandbits(32))
+        pixels = np.asarray(img, dtype=np.float32) + noise_rng.normal(0, variation["noise"], (img.height, img.width))
+        img = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    return img, answers, variation
+
+
+def _sheet_lines(variation: Dict, answers: List[str]) -> List[str]:
+    lines = [f"Name: {variation['name']}", ""]
+    lines += [variation["marker"].format(n=n) + answer for n, answer in enumerate(answers, 1)]
+    return lines
+
+
+def _write_pdf(path: str, variation: Dict, answers: List[str]) -> None:
+    """The same sheet as a digital PDF with a text layer."""
+    import fitz
+    with fitz.open() as doc:
+        page = doc.new_page(width=612, height=792)
+        y = 72
+        for line in _sheet_lines(variation, answers):
+            page.insert_text((72, y), line, fontsize=variation["size_pt"])
+            y += variation["size_pt"] * 2
+        doc.save(path)
+
+
+def generate_pages(directory: str, count: int, seed: int) -> List[Dict]:
+    rng = random.Random(seed)
+    fonts = available_fonts()
+    try:
+        import fitz  # noqa: F401
+        write_pdfs = True
+    except ImportError:
+        write_pdfs = False
+
+    pages = []
+    for index in range(count):
+        img, answers, variation = render_worksheet(rng, fonts)
+        image_path = os.path.join(directory, f"sheet_{index:03d}.png")
+        img.save(image_path, dpi=(variation["dpi"], variation["dpi"]))
+        pdf_path = None
+        if write_pdfs:
+            pdf_path = os.path.join(directory, f"sheet_{index:03d}.pdf")
+            _write_pdf(pdf_path, variation, answers)
+        pages.append({"image": image_path, "pdf": pdf_path, "answers": answers, "variation": variation})
+    return pages
+
+
+def _recognizer(engine: str) -> Callable[[Dict], list]:
+    """Load the engine and return page -> OCR tokens; RuntimeError if it cannot run here."""
+    from app.services import ocr
+    from app.services.ocr_preprocessing import preprocess_image
+
+    if engine == "pdf-text":
+        if not ocr.PYMUPDF_AVAILABLE:
+            raise RuntimeError("PyMuPDF not installed")
+        return lambda page: ocr._classify_pdf_pages(page["pdf"])[0] or []
+    if engine == "tesserocr":
+        if not ocr.TESSEROCR_AVAILABLE:
+            raise RuntimeError("tesserocr not installed")
+        ocr._tesseract_api()
+        return lambda page: ocr._tesserocr_tokens(preprocess_image(page["image"]))
+    if engine == "pytesseract":
+        if not ocr.TESSERACT_AVAILABLE:
+            raise RuntimeError("pytesseract not installed")
+        try:
+            ocr.pytesseract.get_tesseract_version()
+        except Exception as e:
+            raise RuntimeError(str(e))
+        return lambda page: ocr._pytesseract_tokens(preprocess_image(page["image"]))
+    if engine == "easyocr":
+        if not ocr.EASYOCR_AVAILABLE:
+            raise RuntimeError("easyocr not installed")
+        ocr.init_reader_pool(size=1, warmup=True)
+        return lambda page: ocr._easyocr_tokens(preprocess_image(page["image"]))
+    raise RuntimeError(f"Unknown engine {engine!r}")
+
+
+def _normalize(answer: str) -> str:
+    return "".join(answer.lower().split())
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def run_case(engine: str, profile: str, pages: List[Dict]) -> Dict:
+    """Benchmark one engine/profile combination; runs in its own process."""
+    from app.core.config import settings
+    from app.models import Question, QuestionType
+    from app.services.answer_extraction import extract_answers_from_tokens
+
+    for name, value in PROFILES[profile].items():
+        setattr(settings, name, value)
+    result = {"engine": engine, "profile": profile}
+    try:
+        recognize = _recognizer(engine)
+        recognize(pages[0])  # Lazy model state is initialized on first use
+    except Exception as e:
+        result["skipped"] = str(e).strip().splitlines()[0]
+        return result
+
+    correct = total = 0
+    wall_started, cpu_started = time.perf_counter(), time.process_time()
+    for page in pages:
+        tokens = recognize(page)
+        questions = [
+            Question(id=n, text=f"Question {n}", correct_answer=answer, question_type=QuestionType.NUMERIC)
+            for n, answer in enumerate(page["answers"], 1)
+        ]
+        extracted = extract_answers_from_tokens(tokens, questions)
+        for question, answer in zip(questions, extracted):
+            total += 1
+            correct += _normalize(answer["student_answer"]) == _normalize(question.correct_answer)
+    wall = time.perf_counter() - wall_started
+    cpu = time.process_time() - cpu_started
+
+    result.update({
+        "pages": len(pages),
+        "pages_per_second": len(pages) / wall if wall else float("inf"),
+        "cpu_seconds_per_page": cpu / len(pages),
+        "peak_rss_mb": _peak_rss_mb(),
+        "accuracy": correct / total if total else 0.0,
+    })
+    return result
+
+
+def print_results(results: List[Dict]) -> None:
+    header = f"{'engine':<12} {'profile':<12} {'pages/s':>8} {'cpu s/pg':>9} {'peak MB':>8} {'accuracy':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        if "skipped" in r:
+            print(f"{r['engine']:<12} {r['profile']:<12} skipped: {r['skipped']}")
+            continue
+        peak = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "n/a"
+        print(f"{r['engine']:<12} {r['profile']:<12} {r['pages_per_second']:>8.2f} "
+              f"{r['cpu_seconds_per_page']:>9.3f} {peak:>8} {r['accuracy']:>8.1%}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=20, help="synthetic sheets to render")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engines", default=",".join(ENGINES), help="comma-separated subset of " + ", ".join(ENGINES))
+    parser.add_argument("--profiles", default=",".join(PROFILES), help="comma-separated subset of " + ", ".join(PROFILES))
+    parser.add_argument("--json", dest="json_path", help="also write results to this file")
+    args = parser.parse_args()
+
+    engines = [e for e in args.engines.split(",") if e]
+    profiles = [p for p in args.profiles.split(",") if p]
+    unknown = [p for p in profiles if p not in PROFILES] + [e for e in engines if e not in ENGINES]
+    if unknown:
+        parser.error(f"unknown engine/profile: {', '.join(unknown)}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        pages = generate_pages(directory, args.pages, args.seed)
+        print(f"Rendered {len(pages)} sheets x {QUESTIONS_PER_SHEET} answers in {directory}\n")
+        for engine in engines:
+            # Preprocessing only applies to images, not the PDF text layer
+            for profile in (["configured"] if engine == "pdf-text" else profiles):
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                    results.append(executor.submit(run_case, engine, profile, pages).result())
+
+    print_results(results)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Per-request overhead of Ollama calls: a new httpx.AsyncClient per call (how
+llm_feedback used to work) against the shared pooled client.
+
+A stub server stands in for Ollama and answers /api/generate instantly (or
+after --latency-ms), so the timings are the HTTP client overhead alone:
+client construction, TCP connect and teardown. It also counts the
+connections it accepted after warm-up. Client and stub share one event loop.
+
+Run: python benchmarks/ollama_client_benchmark.py [--requests 500] [--concurrency 8]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Awaitable, Callable
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.core.config import settings  # noqa: E402
+from app.services import llm_feedback  # noqa: E402
+
+RESPONSE_BODY = json.dumps({"response": "Nice work! 2 + 2 is 4."}).encode()
+
+
+class StubOllama:
+    """Minimal HTTP/1.1 server with keep-alive that answers every request with RESPONSE_BODY."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.connections = 0
+        self._server = None
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    name, _, value = line.partition(b":")
+                    if name.strip().lower() == b"content-length":
+                        length = int(value)
+                if length:
+                    await reader.readexactly(length)
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(RESPONSE_BODY)}\r\n\r\n".encode()
+                    + RESPONSE_BODY
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def client_per_call(base_url: str) -> None:
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        response = await client.post(
+            f"{base_url}/api/generate",
+            json={"model": settings.OLLAMA_MODEL, "prompt": "Explain 2 + 2", "stream": False}
+        )
+        response.json()
+
+
+async def shared_client(base_url: str) -> None:
+    await llm_feedback.generate_feedback_ollama("What is 2 + 2?", "4", "4", True)
+
+
+async def run(call: Callable[[str], Awaitable[None]], base_url: str, requests: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        async with semaphore:
+            await call(base_url)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return time.perf_counter() - started
+
+
+async def main_async(args) -> None:
+    stub = StubOllama(args.latency_ms / 1000)
+    port = await stub.start()
+    base_url = f"http://127.0.0.1:{port}"
+    settings.OLLAMA_BASE_URL = base_url
+    settings.OLLAMA_MAX_CONNECTIONS = max(settings.OLLAMA_MAX_CONNECTIONS, args.concurrency)
+    settings.OLLAMA_MAX_PARALLEL = max(settings.OLLAMA_MAX_PARALLEL, args.concurrency)
+    llm_feedback.open_client()
+    try:
+        header = f"{'client':<16} {'concurrency':>11} {'ms/request':>11} {'requests/s':>11} {'new conns':>10}"
+        print(header)
+        print("-" * len(header))
+        for concurrency in sorted({1, args.concurrency}):
+            for name, call in (("per call", client_per_call), ("shared (pooled)", shared_client)):
+                await run(call, base_url, min(20, args.requests), concurrency)  # Warm up
+                stub.connections = 0
+                elapsed = await run(call, base_url, args.requests, concurrency)
+                print(f"{name:<16} {concurrency:>11} {elapsed / args.requests * 1e3 * concurrency:>11.3f} "
+                      f"{args.requests / elapsed:>11.0f} {stub.connections:>10}")
+    finally:
+        await llm_feedback.close_client()
+        await stub.stop()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated generation time per request")
+    asyncio.run(main_async(parser.parse_args()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
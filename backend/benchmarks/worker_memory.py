@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Per-worker memory of the API under gunicorn, with and without preload_app.
+
+Starts gunicorn (configured by gunicorn.conf.py) once per mode, waits for all
+workers to serve requests, then reads each worker's memory from
+/proc/<pid>/smaps_rollup:
+
+  RSS  resident pages, shared ones counted in full for every worker
+  PSS  resident pages with shared ones split between the processes sharing them
+  USS  pages private to the worker (what it really costs)
+
+With preload the OCR models and SymPy state live in pages shared with the
+master, so PSS and USS per worker drop while RSS stays similar. Linux only.
+
+Run from backend/ with the usual DATABASE_URL/JWT_SECRET environment:
+    python benchmarks/worker_memory.py [--workers 4]
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Dict, List
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def _children(pid: int) -> List[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; the parent pid follows the closing paren
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+
+def _memory_mb(pid: int) -> Dict[str, float]:
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss": values["Rss"],
+        "pss": values["Pss"],
+        "uss": values["Private_Clean"] + values["Private_Dirty"],
+    }
+
+
+def measure(preload: bool, workers: int, port: int, requests: int, timeout: float) -> Dict:
+    env = dict(os.environ, PRELOAD_APP="true" if preload else "false",
+               WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{port}")
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app.main:app"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        served = 0
+        while served < requests * workers:
+            if master.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with code {master.returncode}")
+            if time.monotonic() > deadline:
+                raise RuntimeError("timed out waiting for workers")
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=5).read()
+                served += 1
+            except OSError:
+                time.sleep(0.5)
+        while len(_children(master.pid)) < workers:
+            time.sleep(0.5)
+        time.sleep(2)  # Let lifespan startup finish in every worker
+
+        worker_memory = [_memory_mb(pid) for pid in _children(master.pid)]
+        master_memory = _memory_mb(master.pid)
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=30)
+
+    def mean(key: str) -> float:
+        return sum(m[key] for m in worker_memory) / len(worker_memory)
+
+    return {
+        "preload": preload,
+        "workers": len(worker_memory),
+        "worker_rss": mean("rss"),
+        "worker_pss": mean("pss"),
+        "worker_uss": mean("uss"),
+        "total_pss": master_memory["pss"] + sum(m["pss"] for m in worker_memory),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--requests", type=int, default=5, help="requests per worker before measuring")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for startup")
+    args = parser.parse_args()
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        parser.error("needs Linux /proc/<pid>/smaps_rollup")
+
+    header = f"{'mode':<12} {'workers':>7} {'RSS/worker':>11} {'PSS/worker':>11} {'USS/worker':>11} {'total PSS':>10}"
+    print(header)
+    print("-" * len(header))
+    for preload in (False, True):
+        r = measure(preload, args.workers, args.port, args.requests, args.timeout)
+        mode = "preload" if preload else "no preload"
+        print(f"{mode:<12} {r['workers']:>7} {r['worker_rss']:>8.0f} MB {r['worker_pss']:>8.0f} MB "
+              f"{r['worker_uss']:>8.0f} MB {r['total_pss']:>7.0f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
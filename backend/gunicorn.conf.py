@@ -0,0 +1,49 @@
+"""
+Gunicorn settings for running the API with several uvicorn workers.
+
+Run from backend/: gunicorn app.main:app (this file is picked up automatically)
+
+With preload_app the master imports the app, loads the OCR models and warms
+SymPy before forking, so workers share those pages copy-on-write instead of
+each loading a copy. gc.freeze() then moves everything loaded so far out of the
+collector's generations: collections in the workers would otherwise write to
+every object header and copy the shared pages one by one.
+Measure the effect with benchmarks/worker_memory.py.
+"""
+import gc
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.environ.get("PRELOAD_APP", "true").lower() in ("1", "true", "yes")
+
+if preload_app:
+    # No collections in the master while the app loads; freeing objects between
+    # allocations leaves holes that workers would later fill and copy
+    gc.disable()
+
+
+def when_ready(server):
+    """Runs in the master after the app was imported, before the first fork."""
+    if not server.cfg.preload_app:
+        return
+    from app.services.warmup import warm_shared_state
+    warm_shared_state()
+    gc.freeze()
+    # The master keeps running (and re-forks replacement workers); only the
+    # frozen objects are exempt from collection from here on
+    gc.enable()
+
+
+def post_fork(server, worker):
+    gc.enable()
+    if server.cfg.preload_app:
+        # The master's import (create_all) left a connection in each pool; a worker
+        # sharing that socket with its siblings would corrupt the protocol stream.
+        # close=False drops the inherited connections without closing them for
+        # the master and the other workers.
+        from app import database
+        from app.core import database as core_database
+        database.engine.dispose(close=False)
+        core_database.engine.dispose(close=False)